@@ -1,9 +1,16 @@
 from flask import Flask, jsonify, Response, request
+from flask.json.provider import DefaultJSONProvider
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from datetime import date
 import os
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from .routes.auth import auth_bp
 from app.routes.companion import chatbot_bp
 from app.routes.reminders import reminder_bp
@@ -19,6 +26,32 @@ load_dotenv()
 jwt = JWTManager()
 
 
+class MementoJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that writes dates as ISO 8601 strings and serializes with
+    orjson when it is installed.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        # response() always passes `separators` (compact) or `indent`
+        # (debug); orjson output is already compact and can indent by 2.
+        # Any other option is only supported by the stdlib.
+        if orjson is None or set(kwargs) - {"indent", "separators"}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+
 def create_app() -> Flask:
     """
     Create and configure the Flask application.
@@ -27,6 +60,7 @@ def create_app() -> Flask:
         Flask: The configured Flask application instance.
     """
     app = Flask(__name__)
+    app.json = MementoJSONProvider(app)
 
     # Updated CORS configuration to explicitly allow content-type header
     # CORS(app,
@@ -65,7 +99,9 @@ def create_app() -> Flask:
     # Set up database connection
     app.config['FIREBASE_DB'] = db
 
-    # Initialize database schema
+    # Initialize database schema. Its existence check is also the worker's
+    # first Firestore call, so the gRPC channel is connected before the
+    # first request arrives.
     try:
         print("Initializing database schema...")
         initialize_schema()
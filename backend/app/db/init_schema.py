@@ -7,7 +7,7 @@ def schema_exists():
     """
     schema_doc_id = "schema_template"
     doc_ref = db.collection('users').document(schema_doc_id)
-    doc = doc_ref.get()
+    doc = doc_ref.get(field_paths=[])
     return doc.exists
 
 def initialize_schema():
@@ -38,17 +38,32 @@ def initialize_schema():
         }
     }
     
+    # Reminders are stored in a 'reminders' subcollection of each user
+    reminder_schema = {
+        'id': '',
+        'title': '',
+        'category': '',  # Lowercase; defaults to the first word of the title
+        'description': '',
+        'timestamp': None,  # Will be a timestamp
+        'timestampMs': 0,  # Same time as epoch milliseconds, for queries
+        'isCompleted': False,
+        'createdAt': None,  # Will be a timestamp
+        'imageUrl': ''
+    }
+    
     # 2. Conversations Collection Schema
     conversation_schema = {
-        'messages': [
-            {
-                'id': '',
-                'sender': '',  # "patient" or "ai"
-                'content': '',
-                'timestamp': None,  # Will be a timestamp
-                'topics': []  # For report insights
-            }
-        ]
+        'patientId': '',
+        'lastMessageAt': None  # Will be a timestamp
+    }
+
+    # Messages are stored in a 'messages' subcollection, one document each
+    message_schema = {
+        'id': '',
+        'sender': '',  # "patient" or "ai"
+        'content': '',
+        'timestamp': None,  # Will be a timestamp
+        'topics': []  # For report insights
     }
     
     # 3. Game Sessions Collection Schema
@@ -83,6 +98,9 @@ def initialize_schema():
                 'summary': '',  # Condensed version for faster retrieval
                 'sourceId': '',  # Reference to original content if needed in other database
                 'vector': [],    # Will be replaced with actual vectors in real documents
+                'normalized': True,  # Vector is stored unit-length
+                'vector_i8': b'',  # int8-quantized copy of the vector for fallback scans
+                'vector_scale': 0.0,  # Scale to dequantize vector_i8
                 'keywords': [],  # Key terms for additional filtering
                 'timestamp': None,  # Will be a timestamp
                 'metadata': {
@@ -102,10 +120,12 @@ def initialize_schema():
     try:
         # Users schema
         db.collection('users').document(schema_doc_id).set(user_schema)
+        db.collection('users').document(schema_doc_id).collection('reminders').document(schema_doc_id).set(reminder_schema)
         print("- Users collection schema initialized")
         
         # Conversations schema
         db.collection('conversations').document(schema_doc_id).set(conversation_schema)
+        db.collection('conversations').document(schema_doc_id).collection('messages').document(schema_doc_id).set(message_schema)
         print("- Conversations collection schema initialized")
         
         # Game Sessions schema
@@ -122,6 +142,8 @@ def initialize_schema():
         print("You may choose to delete them once your application is set up.")
         print("\nNOTE: After adding actual vector data to patientMemoryVectors, you'll need to create")
         print("a vector index using gcloud to enable vector search functionality.")
+        print("\nNOTE: Deploy the composite indexes in backend/firestore.indexes.json")
+        print("(firebase deploy --only firestore:indexes) for the quiz history and stats queries.")
         
     except Exception as e:
         print(f"Error initializing schema: {e}")
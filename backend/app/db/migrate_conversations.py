@@ -0,0 +1,49 @@
+from .firebase import db
+
+
+def migrate_conversations():
+    """
+    One-time migration of conversation messages from the embedded
+    'messages' array on conversations/{patientId} to the
+    conversations/{patientId}/messages subcollection.
+
+    Messages are written with their existing IDs, so running the migration
+    again does not create duplicates. The array field is removed once all of
+    a patient's messages have been copied.
+    """
+    from firebase_admin import firestore
+
+    migrated = 0
+    for conv_doc in db.collection('conversations').stream():
+        messages = (conv_doc.to_dict() or {}).get('messages')
+        if not isinstance(messages, list):
+            continue
+
+        messages_ref = conv_doc.reference.collection('messages')
+
+        # Firestore batches are limited to 500 writes
+        for start in range(0, len(messages), 500):
+            batch = db.batch()
+            for message in messages[start:start + 500]:
+                if not message.get('id'):
+                    continue
+                batch.set(messages_ref.document(message['id']), message)
+            batch.commit()
+
+        timestamps = [m['timestamp'] for m in messages if m.get('timestamp')]
+        update = {
+            'patientId': conv_doc.id,
+            'messages': firestore.DELETE_FIELD
+        }
+        if timestamps:
+            update['lastMessageAt'] = max(timestamps)
+        conv_doc.reference.update(update)
+
+        migrated += 1
+        print(f"- Migrated {len(messages)} messages for {conv_doc.id}")
+
+    print(f"\nMigrated {migrated} conversations to the messages subcollection")
+
+
+if __name__ == "__main__":
+    migrate_conversations()
@@ -0,0 +1,45 @@
+import random
+
+from .firebase import db
+
+
+def migrate_patient_memories():
+    """
+    One-time migration of patient memories from the embedded 'memories'
+    array on patientMemories/{patientId} to the
+    patientMemories/{patientId}/items subcollection.
+
+    Each memory gets a random 'randKey' so quizzes can sample a few memories
+    with a range query. Memories are written with their existing IDs, so
+    running the migration again does not create duplicates.
+    """
+    from firebase_admin import firestore
+
+    migrated = 0
+    for memories_doc in db.collection('patientMemories').stream():
+        memories = (memories_doc.to_dict() or {}).get('memories')
+        if not isinstance(memories, list):
+            continue
+
+        items_ref = memories_doc.reference.collection('items')
+
+        # Firestore batches are limited to 500 writes
+        for start in range(0, len(memories), 500):
+            batch = db.batch()
+            for memory in memories[start:start + 500]:
+                if not memory.get('id'):
+                    continue
+                memory.setdefault('randKey', random.random())
+                batch.set(items_ref.document(memory['id']), memory)
+            batch.commit()
+
+        memories_doc.reference.update({'memories': firestore.DELETE_FIELD})
+
+        migrated += 1
+        print(f"- Migrated {len(memories)} memories for {memories_doc.id}")
+
+    print(f"\nMigrated {migrated} patients to the memory items subcollection")
+
+
+if __name__ == "__main__":
+    migrate_patient_memories()
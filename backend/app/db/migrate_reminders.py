@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from .firebase import db
+from .reminder_stats import (build_summary, stats_summary_ref, timestamp_ms,
+                             title_category)
+
+
+def derived_fields(reminder):
+    """Get the fields computed at write time that a reminder is missing"""
+    fields = {}
+    timestamp = reminder.get('timestamp')
+    if 'timestampMs' not in reminder and isinstance(timestamp, datetime):
+        fields['timestampMs'] = timestamp_ms(timestamp)
+    if 'category' not in reminder:
+        fields['category'] = title_category(reminder.get('title', 'other'))
+    return fields
+
+
+def migrate_user_reminders():
+    """
+    One-time migration of reminders from the embedded 'reminders' array on
+    users/{userId} to the users/{userId}/reminders subcollection.
+
+    Reminders are written with their existing IDs, so running the migration
+    again does not create duplicates.
+    """
+    from firebase_admin import firestore
+
+    migrated = 0
+    for user_doc in db.collection('users').stream():
+        reminders = (user_doc.to_dict() or {}).get('reminders')
+        if not isinstance(reminders, list):
+            continue
+
+        reminders_ref = user_doc.reference.collection('reminders')
+
+        # Firestore batches are limited to 500 writes
+        for start in range(0, len(reminders), 500):
+            batch = db.batch()
+            for reminder in reminders[start:start + 500]:
+                if not reminder.get('id'):
+                    continue
+                reminder.update(derived_fields(reminder))
+                batch.set(reminders_ref.document(reminder['id']), reminder)
+            batch.commit()
+
+        user_doc.reference.update({'reminders': firestore.DELETE_FIELD})
+
+        migrated += 1
+        print(f"- Migrated {len(reminders)} reminders for {user_doc.id}")
+
+    print(f"\nMigrated {migrated} users to the reminders subcollection")
+
+
+def backfill_reminder_fields():
+    """
+    Add the 'timestampMs' and 'category' fields to reminders written before
+    they existed. Reminder queries filter on timestampMs, so reminders
+    without it are left out of lists, /upcoming and /stats until this has run.
+    """
+    backfilled = 0
+    for user_ref in db.collection('users').list_documents():
+        batch = db.batch()
+        pending = 0
+        for doc in user_ref.collection('reminders').stream():
+            fields = derived_fields(doc.to_dict())
+            if not fields:
+                continue
+            batch.update(doc.reference, fields)
+            pending += 1
+            backfilled += 1
+
+            # Firestore batches are limited to 500 writes
+            if pending == 500:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+
+    print(f"Backfilled derived fields on {backfilled} reminders")
+
+
+def rebuild_reminder_stats():
+    """
+    Recompute every user's reminder stats summary (users/{userId}/stats/summary)
+    from their reminders subcollection. Run after migrate_user_reminders, or
+    to repair counters that have drifted.
+    """
+    rebuilt = 0
+    for user_ref in db.collection('users').list_documents():
+        reminders = [
+            doc.to_dict() for doc in user_ref.collection('reminders').stream()
+        ]
+        stats_summary_ref(db, user_ref.id).set(build_summary(reminders))
+        rebuilt += 1
+
+    print(f"Rebuilt reminder stats for {rebuilt} users")
+
+
+if __name__ == "__main__":
+    migrate_user_reminders()
+    backfill_reminder_fields()
+    rebuild_reminder_stats()
@@ -33,6 +33,9 @@ except ImportError:
     print("Please create a firebase.py file with your Firebase configuration.")
     sys.exit(1)
 
+from reminder_stats import (build_summary, stats_summary_ref, timestamp_ms,
+                            title_category)
+
 
 # Initialize Vertex AI for embeddings
 def init_vertex_ai():
@@ -87,6 +90,21 @@ def generate_simulated_embedding(text, dimension=128):
     return vector
 
 
+def normalize_embedding(vector):
+    """Scale an embedding vector to unit length"""
+    v = np.asarray(vector, dtype=np.float32)
+    v /= np.linalg.norm(v) + 1e-9
+    return v.tolist()
+
+
+def quantize_embedding(vector):
+    """Quantize an embedding to int8 with a symmetric per-vector scale"""
+    v = np.asarray(vector, dtype=np.float32)
+    scale = float(np.abs(v).max() / 127) or 1.0
+    q = np.round(v / scale).astype(np.int8)
+    return q.tobytes(), scale
+
+
 def generate_sample_users(num_users=3):
     """Generate sample users with reminders"""
     print("Generating sample users...")
@@ -164,8 +182,10 @@ def generate_sample_users(num_users=3):
             reminders.append({
                 "id": str(uuid.uuid4()),
                 "title": reminder_type["title"],
+                "category": title_category(reminder_type["title"]),
                 "description": reminder_type["description"],
                 "timestamp": reminder_time,
+                "timestampMs": timestamp_ms(reminder_time),
                 "isCompleted": is_completed,
                 "imageUrl": reminder_type["imageUrl"]
             })
@@ -198,15 +218,32 @@ def generate_sample_users(num_users=3):
             'dailyQuestionsCompleted':
             daily_completed,
             'dailyQuestionsTotal':
-            daily_total,
-            'reminders':
-            reminders
+            daily_total
         })
 
+        # Reminders live in the user's reminders subcollection
+        reminders_ref = db.collection('users').document(user_id).collection(
+            'reminders')
+        batch = db.batch()
+        for reminder in reminders:
+            batch.set(reminders_ref.document(reminder['id']), reminder)
+        batch.set(stats_summary_ref(db, user_id),
+                  build_summary(reminders))
+        batch.commit()
+
     print(f"Created {num_users} users with reminders")
     return user_ids
 
 
+def get_display_names(user_ids):
+    """Read the display names of users in a single batched get"""
+    user_refs = [db.collection('users').document(user_id) for user_id in user_ids]
+    return {
+        doc.id: doc.get('displayName')
+        for doc in db.get_all(user_refs, field_paths=['displayName'])
+    }
+
+
 def generate_conversations(user_ids, days_of_history=30):
     """Generate sample conversations between users and AI chatbot"""
     print("Generating sample conversations...")
@@ -284,10 +321,11 @@ def generate_conversations(user_ids, days_of_history=30):
         ]
     }]
 
+    user_names = get_display_names(user_ids)
+
     for user_id in user_ids:
         # Get user info for personalization
-        user_doc = db.collection('users').document(user_id).get().to_dict()
-        user_name = user_doc['displayName'].split()[0]  # First name
+        user_name = user_names[user_id].split()[0]  # First name
 
         # Generate some random personal info for conversation context
         hometown = fake.city()
@@ -453,9 +491,20 @@ def generate_conversations(user_ids, days_of_history=30):
                     ai_message_topics  # Using the same topics as the AI message
                 })
 
-        # Store the conversation
-        db.collection('conversations').document(user_id).set(
-            {'messages': conversation_messages})
+        # Store the conversation, one document per message
+        conv_ref = db.collection('conversations').document(user_id)
+        conv_ref.set({
+            'patientId': user_id,
+            'lastMessageAt': max(
+                (m['timestamp'] for m in conversation_messages),
+                default=datetime.now())
+        })
+        messages_ref = conv_ref.collection('messages')
+        for start in range(0, len(conversation_messages), 500):
+            batch = db.batch()
+            for message in conversation_messages[start:start + 500]:
+                batch.set(messages_ref.document(message['id']), message)
+            batch.commit()
 
     print(f"Generated conversations for {len(user_ids)} users")
     return True
@@ -581,9 +630,10 @@ def generate_patient_memories(user_ids):
 
     memory_types = ["photo", "diary", "medical", "biography", "milestone"]
 
+    user_names = get_display_names(user_ids)
+
     for user_id in user_ids:
-        user_doc = db.collection('users').document(user_id).get().to_dict()
-        user_name = user_doc['displayName']
+        user_name = user_names[user_id]
 
         # Generate some context data for memories
         family_names = [fake.name() for _ in range(5)]
@@ -638,6 +688,7 @@ def generate_patient_memories(user_ids):
 
             memories.append({
                 'id': str(uuid.uuid4()),
+                'randKey': random.random(),  # Used for random sampling
                 'title': title,
                 'content': content,
                 'imageUrl': image_url,
@@ -651,9 +702,13 @@ def generate_patient_memories(user_ids):
                 }
             })
 
-        # Store the memories
-        db.collection('patientMemories').document(user_id).set(
-            {'memories': memories})
+        # Store the memories, one document per memory
+        items_ref = db.collection('patientMemories').document(
+            user_id).collection('items')
+        batch = db.batch()
+        for memory in memories:
+            batch.set(items_ref.document(memory['id']), memory)
+        batch.commit()
 
     print(f"Generated memories for {len(user_ids)} users")
     return True
@@ -665,12 +720,9 @@ def generate_memory_vectors(user_ids):
 
     for user_id in user_ids:
         # Get patient memories
-        memories_doc = db.collection('patientMemories').document(user_id).get()
-
-        if not memories_doc.exists:
-            continue
-
-        memories = memories_doc.to_dict().get('memories', [])
+        items_ref = db.collection('patientMemories').document(
+            user_id).collection('items')
+        memories = [doc.to_dict() for doc in items_ref.stream()]
 
         if not memories:
             continue
@@ -694,8 +746,10 @@ def generate_memory_vectors(user_ids):
             # For each memory, create a vector chunk
             summary = f"{memory.get('title', 'Untitled memory')}: {memory.get('content', '')[:200]}..."
 
-            # Generate embedding vector
-            vector = generate_real_embedding(summary)
+            # Generate embedding vector, stored unit-length so that cosine
+            # similarity at query time is a plain dot product
+            vector = normalize_embedding(generate_real_embedding(summary))
+            vector_i8, vector_scale = quantize_embedding(vector)
 
             # Add document to chunks subcollection
             memory_id = memory.get('id', str(uuid.uuid4()))
@@ -708,6 +762,12 @@ def generate_memory_vectors(user_ids):
                 memory_id,  # Reference to original memory
                 'vector':
                 vector,
+                'normalized':
+                True,
+                'vector_i8':
+                vector_i8,
+                'vector_scale':
+                vector_scale,
                 'keywords':
                 memory.get('keywords', []),
                 'timestamp':
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+
+def title_category(title, category=None):
+    """
+    Get the category to store on a reminder: the given category, or else
+    the first word of its title
+    """
+    if not category:
+        words = title.split()
+        category = words[0] if words else 'other'
+    return category.lower()
+
+
+def reminder_category(reminder):
+    """Get the category of a reminder, derived from its title if not stored"""
+    return reminder.get('category') or title_category(
+        reminder.get('title', 'other'))
+
+
+def timestamp_ms(timestamp):
+    """
+    Get a reminder timestamp as epoch milliseconds, for the 'timestampMs'
+    field that reminder range queries filter and sort on. Naive datetimes
+    are taken as UTC, the same way Firestore stores them.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def stats_summary_ref(db, patient_id):
+    """
+    Get the reminder stats summary of a patient (users/{id}/stats/summary)
+
+    The summary holds reminder counters maintained on every reminder write:
+    'by_category' maps each category and 'daily' maps each YYYY-MM-DD date
+    to {'total', 'completed'} counts.
+    """
+    return db.collection('users').document(patient_id).collection(
+        'stats').document('summary')
+
+
+def add_to_summary(deltas, reminder, sign=1):
+    """
+    Accumulate the counter changes for adding (sign=1) or removing
+    (sign=-1) a reminder into deltas, returning deltas
+    """
+    completed = sign if reminder.get('isCompleted', False) else 0
+
+    buckets = [('by_category', reminder_category(reminder))]
+    timestamp = reminder.get('timestamp')
+    if isinstance(timestamp, datetime):
+        buckets.append(('daily', timestamp.strftime('%Y-%m-%d')))
+
+    for group, key in buckets:
+        counts = deltas.setdefault(group, {}).setdefault(
+            key, {'total': 0, 'completed': 0})
+        counts['total'] += sign
+        counts['completed'] += completed
+
+    return deltas
+
+
+def build_summary(reminders):
+    """Build a complete stats summary document for a patient's reminders"""
+    summary = {}
+    for reminder in reminders:
+        add_to_summary(summary, reminder)
+    return summary
+
+
+def summary_increments(deltas):
+    """
+    Convert accumulated counter changes into Increment transforms for
+    set(..., merge=True), leaving out counters that don't change
+    """
+    increments = {}
+    for group, entries in deltas.items():
+        for key, counts in entries.items():
+            changed = {
+                field: firestore.Increment(value)
+                for field, value in counts.items() if value
+            }
+            if changed:
+                increments.setdefault(group, {})[key] = changed
+    return increments
+
+
+def completion_rate(completed, total):
+    """Get a completion percentage rounded to one decimal, 0 when total is 0"""
+    return round(completed / total * 100, 1) if total else 0
+
+
+def compute_stats(summary, today, days, not_yet_due=None):
+    """
+    Build the reminder statistics for the `days` days up to `today` from a
+    stats summary document, without the time-dependent 'upcoming' count
+
+    Only reminders that are already due are counted, so not_yet_due holds
+    the {'total', 'completed'} counts of today's reminders that are still
+    ahead; they are taken out of today's bucket.
+    """
+    not_yet_due = not_yet_due or {}
+
+    # Daily completion trend, oldest first; the summary's YYYY-MM-DD keys
+    # are date.isoformat() strings
+    daily_counts = summary.get('daily', {})
+    trend = []
+    for i in range(days, -1, -1):
+        day_str = (today - timedelta(days=i)).isoformat()
+        counts = daily_counts.get(day_str, {})
+        total = counts.get('total', 0)
+        completed = counts.get('completed', 0)
+        if i == 0:
+            total = max(total - not_yet_due.get('total', 0), 0)
+            completed = max(completed - not_yet_due.get('completed', 0), 0)
+        trend.append({
+            'date': day_str,
+            'total': total,
+            'completed': completed,
+            'rate': completion_rate(completed, total)
+        })
+
+    # Total the analysis period
+    total = sum(day['total'] for day in trend)
+    completed = sum(day['completed'] for day in trend)
+
+    by_category = {
+        category: {
+            'total': counts['total'],
+            'completed': counts.get('completed', 0),
+            'completion_rate': completion_rate(counts.get('completed', 0),
+                                               counts['total'])
+        }
+        for category, counts in summary.get('by_category', {}).items()
+        if counts.get('total', 0) > 0
+    }
+
+    return {
+        'total': total,
+        'completed': completed,
+        'missed': total - completed,
+        'completion_rate': completion_rate(completed, total),
+        'by_category': by_category,
+        'daily_completion': [day['rate'] for day in trend],  # Oldest first
+        'completion_trend': trend
+    }
@@ -0,0 +1,67 @@
+# embedding_cache.py
+
+import atexit
+import hashlib
+import os
+import shelve
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# Default cache file, next to this module rather than in the current directory
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "emb_cache.db")
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of text embeddings, so the constant queries of the test
+    scripts are only sent to the embedding API once across runs.
+
+    Embeddings are stored on disk in a shelve file as float32 bytes, keyed by
+    the SHA-256 of the model name and text (NUL-separated), with the most
+    recently used ones also kept in memory.
+    """
+
+    def __init__(self, model_name: str, path: str = DEFAULT_CACHE_PATH,
+                 maxsize: int = 1024):
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._shelf = shelve.open(path)
+        atexit.register(self.close)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(
+            f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Get the cached embedding of text, or None"""
+        key = self._key(text)
+        vector = self._memory.get(key)
+        if vector is None:
+            data = self._shelf.get(key)
+            if data is None:
+                return None
+            vector = np.frombuffer(data, dtype=np.float32)
+        self._remember(key, vector)
+        return vector
+
+    def put(self, text: str, embedding) -> np.ndarray:
+        """Cache the embedding of text, returning it as a float32 array"""
+        key = self._key(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._shelf[key] = vector.tobytes()
+        self._remember(key, vector)
+        return vector
+
+    def close(self):
+        """Write the cache to disk"""
+        self._shelf.close()
@@ -7,13 +7,29 @@ import os
 # Load environment variables
 load_dotenv()
 
+# Number of Firestore clients (each with its own channel) to spread load over
+FIRESTORE_POOL_SIZE = int(os.getenv("FIRESTORE_POOL_SIZE", "4"))
+
 # Keep track of initialization status
 _initialized = False
 _db = None
+_db_pool = []
+
+
+def _create_client(app):
+    """
+    Create a Firestore client with its own gRPC channel. The SDK creates
+    channels with a 30s keepalive, so idle channels aren't dropped by NAT or
+    load balancers between infrequent calls (forcing a new TLS handshake).
+    """
+    from google.cloud import firestore as gcp_firestore
+
+    return gcp_firestore.Client(project=app.project_id,
+                                credentials=app.credential.get_credential())
 
 
 def initialize_firebase():
-    global _initialized, _db
+    global _initialized, _db, _db_pool
 
     if _initialized:
         return _db
@@ -31,11 +47,18 @@ def initialize_firebase():
                     "FIREBASE_CREDENTIALS_PATH environment variable not set")
 
             cred = credentials.Certificate(cred_path)
-            firebase_admin.initialize_app(cred)
+            app = firebase_admin.initialize_app(cred)
             print("Firebase initialized successfully")
 
-        # Get Firestore client
-        _db = firestore.client()
+        # Get Firestore clients
+        try:
+            _db_pool = [
+                _create_client(app) for _ in range(max(FIRESTORE_POOL_SIZE, 1))
+            ]
+        except Exception as e:
+            print(f"Could not create pooled Firestore clients: {e}")
+            _db_pool = [firestore.client()]
+        _db = _db_pool[0]
         _initialized = True
         return _db
     except Exception as e:
@@ -43,5 +66,14 @@ def initialize_firebase():
         raise
 
 
+def get_db(key=None):
+    """Return a pooled Firestore client, chosen consistently for `key`"""
+    if not _db_pool:
+        initialize_firebase()
+    if key is None:
+        return _db
+    return _db_pool[hash(key) % len(_db_pool)]
+
+
 # Initialize Firebase when this module is imported
 db = initialize_firebase()
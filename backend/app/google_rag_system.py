@@ -2,19 +2,211 @@
 
 import os
 import base64
+import logging
+import threading
 import uuid
 from datetime import datetime
+from functools import cached_property
+from importlib import metadata
 from typing import List, Dict, Any, Optional, Tuple
 
-# Google Cloud imports
-from google.cloud import speech_v1p1beta1 as speech
-from google.cloud import texttospeech
-from google.cloud import aiplatform
-from google.cloud import language_v1
-from vertexai.language_models import TextEmbeddingModel
-from vertexai.generative_models import GenerativeModel
+import numpy as np
+from cachetools import TTLCache
+
+# Google Cloud SDKs are imported lazily by the properties below so that
+# processes which only handle text turns don't pay for loading every client
+from google.api_core import exceptions as api_exceptions
+from google.api_core import retry as api_retry
 from firebase_admin import firestore
 
+# Under the app package this is a child of the Flask app's logger, so these
+# records reach its handlers
+logger = logging.getLogger(__name__)
+
+# Vertex AI model used for query and memory embeddings, and the most texts
+# it accepts in one request
+EMBEDDING_MODEL_NAME = "textembedding-gecko@latest"
+EMBEDDING_BATCH_SIZE = 5
+
+# Patients whose packed memory matrices are kept for the fallback scan, and
+# the seconds one is reused before the chunks are read from Firestore again
+MEMORY_CACHE_SIZE = 256
+MEMORY_CACHE_TTL = 300
+
+# Memory chunk fields read by fallback scans: the compact int8 copy of the
+# vector and the metadata, but not the float `vector` used by vector search
+FALLBACK_CHUNK_FIELDS = [
+    "id", "summary", "sourceId", "keywords", "timestamp", "metadata",
+    "vector_i8", "vector_scale"
+]
+
+# Oldest google-cloud-firestore release that ships `find_nearest`
+MIN_VECTOR_SEARCH_VERSION = (2, 16)
+
+
+def _firestore_version() -> Tuple[int, ...]:
+    """Return the installed google-cloud-firestore version as an int tuple"""
+    try:
+        version = metadata.version("google-cloud-firestore")
+    except metadata.PackageNotFoundError:
+        return ()
+    parts = []
+    for part in version.split(".")[:2]:
+        digits = "".join(ch for ch in part if ch.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+def _log_retry(exc: Exception):
+    """Log each retried Google Cloud call so chronic quota limits are visible"""
+    logger.warning("metric rag.google_api.retry error=%s: %s",
+                   type(exc).__name__, exc)
+
+
+# Jittered exponential backoff for Vertex AI / Natural Language calls that
+# hit quota (RESOURCE_EXHAUSTED) or transient availability errors
+GOOGLE_API_RETRY = api_retry.Retry(
+    predicate=api_retry.if_exception_type(api_exceptions.ResourceExhausted,
+                                          api_exceptions.ServiceUnavailable,
+                                          api_exceptions.DeadlineExceeded),
+    initial=1.0,
+    maximum=16.0,
+    multiplier=2.0,
+    timeout=45.0,
+    on_error=_log_retry)
+
+
+def _top_k_indices(sims: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest similarities, highest first"""
+    k = min(k, len(sims))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    # Partition in O(N), then only sort the k selected entries
+    top_idx = np.argpartition(-sims, k - 1)[:k]
+    return top_idx[np.argsort(-sims[top_idx])]
+
+
+def quantize_rows(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with a per-row scale: row ~= row_i8 * scale"""
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    rows_i8 = np.round(matrix / scales[:, None]).astype(np.int8)
+    return rows_i8, scales.astype(np.float32)
+
+
+def load_memory_chunks(db, patient_id: str, dimension: int,
+                       generate_embedding) -> Tuple[np.ndarray, np.ndarray,
+                                                    List[Dict[str, Any]]]:
+    """
+    Read a patient's memory chunks for a fallback similarity scan.
+
+    Only the int8 copy of each vector is read with the chunk metadata; the
+    float `vector` (used by vector search) is fetched, in one batched read,
+    just for chunks written without an int8 copy. Chunks of another
+    dimension are re-embedded from their summary with generate_embedding.
+
+    Returns (matrix_i8, scales, chunks): one int8 row per chunk of its
+    unit-length vector, the float32 scale of each row, and the chunk dicts
+    without any vector fields.
+    """
+    chunks_ref = db.collection("patientMemoryVectors").document(
+        patient_id).collection("chunks")
+
+    # Sort each chunk into the stored int8 or float32 batch
+    quantized_rows = []
+    quantized_scales = []
+    quantized_chunks = []
+    legacy_refs = []
+    legacy_chunks = {}
+    for chunk_doc in chunks_ref.select(FALLBACK_CHUNK_FIELDS).stream():
+        chunk = chunk_doc.to_dict()
+        vector_i8 = chunk.pop("vector_i8", None)
+        scale = chunk.pop("vector_scale", 0.0)
+        if vector_i8 and len(vector_i8) == dimension:
+            # An all-zero vector has no direction to compare against
+            if scale <= 0 or not any(vector_i8):
+                continue
+            quantized_rows.append(bytes(vector_i8))
+            quantized_scales.append(scale)
+            quantized_chunks.append(chunk)
+        else:
+            legacy_refs.append(chunk_doc.reference)
+            legacy_chunks[chunk_doc.id] = chunk
+
+    float_rows = []
+    float_normalized = []
+    float_chunks = []
+    if legacy_refs:
+        for vector_doc in db.get_all(legacy_refs,
+                                     field_paths=["vector", "normalized"]):
+            chunk = legacy_chunks[vector_doc.id]
+            fields = vector_doc.to_dict() or {}
+            memory_vector = fields.get("vector")
+
+            # Skip memories without a vector
+            if not memory_vector:
+                continue
+
+            normalized = fields.get("normalized", False)
+
+            # Check for dimension mismatch and handle it
+            memory_dimension = len(memory_vector)
+
+            if memory_dimension != dimension:
+                logger.warning(
+                    "Memory vector dimension (%d) doesn't match query "
+                    "dimension (%d)", memory_dimension, dimension)
+
+                # Generate a new embedding for the memory's summary
+                if "summary" in chunk:
+                    try:
+                        memory_vector = generate_embedding(chunk["summary"])
+                        normalized = False
+                    except Exception:
+                        logger.exception("Error regenerating embedding")
+                        continue
+                else:
+                    continue
+
+            if len(memory_vector) != dimension:
+                logger.warning(
+                    "Error calculating similarity: regenerated embedding "
+                    "has dimension %d", len(memory_vector))
+                continue
+
+            float_rows.append(memory_vector)
+            float_normalized.append(normalized)
+            float_chunks.append(chunk)
+
+    # One contiguous float32 matrix, with the rows not written as
+    # `normalized` scaled to unit length. Zero (or non-finite) vectors have
+    # no cosine similarity, so they are left out.
+    float_matrix = np.asarray(float_rows, dtype=np.float32).reshape(
+        len(float_rows), dimension)
+    norms = np.sqrt(np.einsum("ij,ij->i", float_matrix, float_matrix))
+    usable = np.isfinite(norms) & (norms > 0)
+    if not usable.all():
+        float_matrix = float_matrix[usable]
+        norms = norms[usable]
+        float_normalized = [n for n, ok in zip(float_normalized, usable) if ok]
+        float_chunks = [c for c, ok in zip(float_chunks, usable) if ok]
+    unnormalized = ~np.array(float_normalized, dtype=bool)
+    if unnormalized.any():
+        float_matrix[unnormalized] /= norms[unnormalized][:, None]
+
+    # Quantize the float rows the same way as stored int8 vectors, so all
+    # chunks are scored with a single int8 matrix product
+    float_i8, float_scales = quantize_rows(float_matrix)
+
+    stored_i8 = np.frombuffer(b"".join(quantized_rows),
+                              dtype=np.int8).reshape(len(quantized_rows),
+                                                     dimension)
+
+    return (np.concatenate([stored_i8, float_i8]),
+            np.concatenate(
+                [np.array(quantized_scales, dtype=np.float32),
+                 float_scales]), quantized_chunks + float_chunks)
+
 
 class MementoRAGSystem:
     """Retrieval-Augmented Generation system for Memento using Google Cloud services"""
@@ -24,40 +216,98 @@ class MementoRAGSystem:
         # Get project ID from environment variable if not provided
         self.project_id = project_id or os.environ.get("GCP_PROJECT_ID")
         if not self.project_id:
-            print("Warning: GCP_PROJECT_ID not set. Using 'test-project-id'")
+            logger.warning("GCP_PROJECT_ID not set. Using 'test-project-id'")
             self.project_id = "test-project-id"
 
-        try:
-            # Initialize Vertex AI
-            aiplatform.init(project=self.project_id)
-
-            # Initialize clients
-            self.speech_client = speech.SpeechClient()
-            self.tts_client = texttospeech.TextToSpeechClient()
-            self.language_client = language_v1.LanguageServiceClient()
-
-            # Initialize models
-            self.embedding_model = TextEmbeddingModel.from_pretrained(
-                "textembedding-gecko@latest")
-            self.gemini_model = GenerativeModel("gemini-pro")
+        self._vertex_initialized = False
 
+        try:
             # Get Firestore client - use the provided one or import from firebase_init
+            self._get_pooled_db = None
             if db is not None:
                 self.db = db
             else:
                 # Import the already initialized Firebase
-                from firebase_init import db as firebase_db
+                from firebase_init import db as firebase_db, get_db
                 self.db = firebase_db
-
-            print(
-                f"Memento RAG System initialized with project ID: {self.project_id}"
-            )
-        except Exception as e:
-            print(f"Error initializing RAG system: {e}")
+                self._get_pooled_db = get_db
+
+            # Resolve vector search support once instead of on every query
+            self.vector_cls = None
+            self.distance_measure = None
+            self.fallback_hits = 0
+            self._memory_matrices = TTLCache(maxsize=MEMORY_CACHE_SIZE,
+                                             ttl=MEMORY_CACHE_TTL)
+            self._memory_matrices_lock = threading.Lock()
+            if _firestore_version() >= MIN_VECTOR_SEARCH_VERSION:
+                try:
+                    from google.cloud.firestore_v1.vector import Vector
+                    from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
+                    self.vector_cls = Vector
+                    self.distance_measure = DistanceMeasure
+                except ImportError as e:
+                    logger.warning("Firestore vector search not available: %s",
+                                   e)
+            else:
+                logger.warning(
+                    "Firestore vector search requires google-cloud-firestore "
+                    ">= %s", ".".join(map(str, MIN_VECTOR_SEARCH_VERSION)))
+
+            logger.info("Memento RAG System initialized with project ID: %s",
+                        self.project_id)
+        except Exception:
+            logger.exception("Error initializing RAG system")
             raise
 
+    def _db_for(self, patient_id: str):
+        """Firestore client for a patient, spread across the client pool"""
+        if self._get_pooled_db is None:
+            return self.db
+        return self._get_pooled_db(patient_id)
+
+    def _init_vertex(self):
+        """Initialize Vertex AI on first use of a Vertex model"""
+        if not self._vertex_initialized:
+            from google.cloud import aiplatform
+            aiplatform.init(project=self.project_id)
+            self._vertex_initialized = True
+
+    @cached_property
+    def speech_client(self):
+        """Google Cloud Speech-to-Text client"""
+        from google.cloud import speech_v1p1beta1 as speech
+        return speech.SpeechClient()
+
+    @cached_property
+    def tts_client(self):
+        """Google Cloud Text-to-Speech client"""
+        from google.cloud import texttospeech
+        return texttospeech.TextToSpeechClient()
+
+    @cached_property
+    def language_client(self):
+        """Google Cloud Natural Language client"""
+        from google.cloud import language_v1
+        return language_v1.LanguageServiceClient()
+
+    @cached_property
+    def embedding_model(self):
+        """Vertex AI text embedding model"""
+        from vertexai.language_models import TextEmbeddingModel
+        self._init_vertex()
+        return TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL_NAME)
+
+    @cached_property
+    def gemini_model(self):
+        """Vertex AI Gemini model"""
+        from vertexai.generative_models import GenerativeModel
+        self._init_vertex()
+        return GenerativeModel("gemini-pro")
+
     def text_to_speech(self, text: str, language_code: str = "en-US") -> bytes:
         """Convert text to speech using Google Cloud Text-to-Speech"""
+        from google.cloud import texttospeech
+
         synthesis_input = texttospeech.SynthesisInput(text=text)
 
         # Configure voice
@@ -79,13 +329,33 @@ class MementoRAGSystem:
 
         return response.audio_content
 
+    @GOOGLE_API_RETRY
     def generate_embedding(self, text: str) -> List[float]:
         """Generate text embeddings using Vertex AI"""
         embeddings = self.embedding_model.get_embeddings([text])
         return embeddings[0].values
 
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts in as few requests as possible"""
+        embeddings = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            embeddings.extend(
+                self._embed_batch(texts[start:start + EMBEDDING_BATCH_SIZE]))
+        return embeddings
+
+    @GOOGLE_API_RETRY
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one request's worth of texts"""
+        return [
+            embedding.values
+            for embedding in self.embedding_model.get_embeddings(texts)
+        ]
+
+    @GOOGLE_API_RETRY
     def analyze_sentiment(self, text: str) -> Dict[str, Any]:
         """Analyze sentiment and extract entities using Natural Language API"""
+        from google.cloud import language_v1
+
         document = language_v1.Document(
             content=text, type_=language_v1.Document.Type.PLAIN_TEXT)
 
@@ -139,23 +409,27 @@ class MementoRAGSystem:
                           query_text: str,
                           limit: int = 5) -> List[Dict[str, Any]]:
         """Retrieve relevant memories for a patient based on query text"""
-        # Generate query embedding
-        query_embedding = self.generate_embedding(query_text)
-
-        try:
-            # Try using Firestore's vector search with the newer API
-            from google.cloud.firestore_v1.vector import Vector
-            from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
-
+        return self.retrieve_memories_with_embedding(
+            patient_id, self.generate_embedding(query_text), limit)
+
+    def retrieve_memories_with_embedding(
+            self,
+            patient_id: str,
+            query_embedding: List[float],
+            limit: int = 5) -> List[Dict[str, Any]]:
+        """Retrieve relevant memories for a patient from a precomputed query embedding"""
+        db = self._db_for(patient_id)
+
+        if self.vector_cls is not None:
             # Get the chunks collection reference
-            chunks_ref = self.db.collection("patientMemoryVectors").document(
+            chunks_ref = db.collection("patientMemoryVectors").document(
                 patient_id).collection("chunks")
 
             # Perform vector search
             vector_query = chunks_ref.find_nearest(
                 vector_field="vector",
-                query_vector=Vector(query_embedding),
-                distance_measure=DistanceMeasure.COSINE,
+                query_vector=self.vector_cls(query_embedding),
+                distance_measure=self.distance_measure.COSINE,
                 limit=limit)
 
             # Get the results
@@ -174,77 +448,78 @@ class MementoRAGSystem:
 
             return memories
 
-        except (ImportError, AttributeError) as e:
-            # Fall back to manual similarity calculation if vector search is not available
-            print(f"Firestore vector search not available: {e}")
-            print("Falling back to manual similarity...")
-
-            # Get all memories for the patient
-            memories_ref = self.db.collection("patientMemoryVectors").document(
-                patient_id).collection("chunks")
-            memories = list(memories_ref.stream())
-
-            # Calculate similarity for each memory
-            memory_scores = []
-            for memory_doc in memories:
-                memory = memory_doc.to_dict()
-                memory_vector = memory.get("vector")
-
-                # Skip memories without a vector
-                if not memory_vector:
-                    continue
-
-                # Check for dimension mismatch and handle it
-                memory_dimension = len(memory_vector)
-                query_dimension = len(query_embedding)
-
-                if memory_dimension != query_dimension:
-                    print(
-                        f"Warning: Memory vector dimension ({memory_dimension}) doesn't match query dimension ({query_dimension})"
-                    )
-
-                    # Generate a new embedding for the memory's summary
-                    if "summary" in memory:
-                        try:
-                            memory_vector = self.generate_embedding(
-                                memory["summary"])
-                        except Exception as e:
-                            print(f"Error regenerating embedding: {e}")
-                            continue
-                    else:
-                        continue
-
-                # Calculate cosine similarity
-                import numpy as np
-                memory_vector = np.array(memory_vector)
-                query_vector = np.array(query_embedding)
-
-                try:
-                    similarity = np.dot(memory_vector, query_vector) / (
-                        np.linalg.norm(memory_vector) *
-                        np.linalg.norm(query_vector))
-
-                    # Add to list with similarity score
-                    memory["similarity"] = float(similarity)
-                    memory_scores.append(memory)
-                except ValueError as e:
-                    print(f"Error calculating similarity: {e}")
-                    continue
-
-            # Sort by similarity (highest first) and take top results
-            memory_scores.sort(key=lambda x: x["similarity"], reverse=True)
-            return memory_scores[:limit]
+        # The manual scan reads every chunk document for the patient, so it is
+        # only allowed when explicitly enabled (e.g. local emulator/dev setups)
+        if not os.getenv("ALLOW_SLOW_FALLBACK"):
+            raise RuntimeError(
+                "Firestore vector search is not available and "
+                "ALLOW_SLOW_FALLBACK is not set")
+
+        self.fallback_hits += 1
+        logger.warning(
+            "metric rag.retrieve_memories.fallback_hits=%d patient_id=%s",
+            self.fallback_hits, patient_id)
+
+        # Normalize the query once; the cached memory rows are unit-length
+        # before quantization so each similarity is a single dot product.
+        # An empty or zero query matches nothing.
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vector)
+        if not np.isfinite(query_norm) or query_norm == 0:
+            return []
+        query_vector /= query_norm
+
+        matrix_i8, scales, metas = self._memory_matrix(db, patient_id,
+                                                       len(query_vector))
+        if not metas:
+            return []
+
+        # Symmetric int8 quantization: sim ~= (M_i8 . q_i8) * scale_m * scale_q
+        query_scale = float(np.abs(query_vector).max() / 127) or 1.0
+        query_i8 = np.round(query_vector / query_scale).astype(np.int8)
+        raw = matrix_i8.astype(np.int32) @ query_i8.astype(np.int32)
+        scores = raw * (scales * query_scale)
+
+        # Take top results, highest similarity first. The cached metadata is
+        # shared between queries, so each result gets its own copy.
+        top_idx = _top_k_indices(scores, limit)
+        return [{**metas[i], "similarity": float(scores[i])} for i in top_idx]
+
+    def _memory_matrix(self, db, patient_id: str, query_dimension: int):
+        """
+        A patient's memory chunks packed as arrays for the fallback scan,
+        cached for MEMORY_CACHE_TTL seconds (for up to MEMORY_CACHE_SIZE
+        patients) so repeated queries skip reading and repacking every
+        chunk document.
 
+        Returns (matrix_i8, scales, metas) as load_memory_chunks does.
+        """
+        cache_key = (patient_id, query_dimension)
+        with self._memory_matrices_lock:
+            packed = self._memory_matrices.get(cache_key)
+        if packed is not None:
+            return packed
+
+        packed = load_memory_chunks(db, patient_id, query_dimension,
+                                    self.generate_embedding)
+        with self._memory_matrices_lock:
+            self._memory_matrices[cache_key] = packed
+        return packed
+
+    @GOOGLE_API_RETRY
     def generate_response(self, patient_info: Dict[str, Any],
                           memories: List[Dict[str,
                                               Any]], user_message: str) -> str:
         """Generate a response using Gemini and retrieved memories"""
         # Format memories as context
-        memories_context = ""
-        for i, memory in enumerate(memories):
+        memory_lines = []
+        for i, memory in enumerate(memories, 1):
             mem_type = memory.get("metadata", {}).get("type", "memory")
             similarity = memory.get("similarity", 0.0)
-            memories_context += f"{i+1}. {memory.get('summary', '')} (Type: {mem_type}, Relevance: {similarity:.2f})\n"
+            memory_lines.append(
+                f"{i}. {memory.get('summary', '')} (Type: {mem_type}, Relevance: {similarity:.2f})\n"
+            )
+        memories_context = "".join(memory_lines)
 
         # Generate prompt for Gemini
         prompt = f"""
@@ -277,17 +552,9 @@ class MementoRAGSystem:
                            ai_response: str,
                            sentiment_data: Dict[str, Any]) -> Tuple[str, str]:
         """Store the conversation in Firestore"""
-        # Get existing conversation
-        conv_ref = self.db.collection("conversations").document(patient_id)
-        conv_doc = conv_ref.get()
-
-        if not conv_doc.exists:
-            # Create new conversation document
-            conv_ref.set({"messages": []})
-            messages = []
-        else:
-            # Get existing messages
-            messages = conv_doc.to_dict().get("messages", [])
+        db = self._db_for(patient_id)
+        conv_ref = db.collection("conversations").document(patient_id)
+        messages_ref = conv_ref.collection("messages")
 
         # Add user message
         current_time = datetime.now()
@@ -311,10 +578,17 @@ class MementoRAGSystem:
             "timestamp": current_time
         }
 
-        # Update Firestore
-        messages.append(user_message_obj)
-        messages.append(ai_message_obj)
-        conv_ref.update({"messages": messages})
+        # Write both messages to the messages subcollection in one batch,
+        # without reading the existing conversation
+        batch = db.batch()
+        batch.set(conv_ref, {
+            "patientId": patient_id,
+            "lastMessageAt": current_time
+        },
+                  merge=True)
+        batch.set(messages_ref.document(user_msg_id), user_message_obj)
+        batch.set(messages_ref.document(ai_msg_id), ai_message_obj)
+        batch.commit()
 
         return user_msg_id, ai_msg_id
 
@@ -322,9 +596,10 @@ class MementoRAGSystem:
                              message: str) -> Dict[str, Any]:
         """Process a text message from a patient and generate a response"""
         try:
-            # Get patient info
-            patient_doc = self.db.collection("users").document(
-                patient_id).get()
+            # Get patient info, fetching only the profile fields used below
+            patient_doc = self._db_for(patient_id).collection(
+                "users").document(patient_id).get(
+                    field_paths=["displayName", "personalInfo"])
             if not patient_doc.exists:
                 return {"error": "Patient not found"}
 
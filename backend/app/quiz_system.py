@@ -1,13 +1,118 @@
 import os
+import random
+import re
+import threading
 import uuid
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
+from cachetools import LRUCache
+
 # Google Cloud imports
+from firebase_admin import firestore
 from google.cloud import aiplatform
 from vertexai.language_models import TextEmbeddingModel
 from vertexai.generative_models import GenerativeModel
 
+from .google_rag_system import (EMBEDDING_BATCH_SIZE, EMBEDDING_MODEL_NAME,
+                                _top_k_indices, load_memory_chunks)
+
+# Number of distinct texts whose embeddings are kept in memory
+EMBEDDING_CACHE_SIZE = 4096
+
+# Number of memories sampled as quiz seeds
+MEMORY_SAMPLE_SIZE = 10
+
+# Recent patient messages used as queries for related memories in mixed
+# quizzes, and the memories retrieved for each
+QUIZ_SEED_QUERIES = 3
+MEMORIES_PER_SEED_QUERY = 2
+
+# Number of recent quiz scores averaged into a patient's memory score
+RECENT_SCORES_WINDOW = 5
+
+# Fallback similarity searches with at least this many memory rows are moved
+# to the GPU when PyTorch with CUDA is installed
+GPU_MIN_ROWS = 4096
+
+# Stored copies of a memory chunk's vector, left out of retrieved memories
+VECTOR_FIELDS = ("vector", "vector_i8", "vector_scale")
+
+# Worker threads used to overlap independent Firestore requests
+IO_WORKERS = 5
+
+# Quiz types broken out in patient statistics
+QUIZ_TYPES = ("memory", "conversation", "mixed", "general")
+
+# Number of most recent completed quizzes returned in the stats score trend
+STATS_TREND_LIMIT = 10
+
+# Static quiz instructions, appended to every quiz prompt
+QUIZ_INSTRUCTIONS = """
+        INSTRUCTIONS:
+        1. Create the requested number of multiple-choice questions that would help exercise the patient's memory
+        2. Each question should have 4 possible answers, with only one being correct
+        3. Questions should be gentle and supportive, not frustrating
+        4. Include a mix of difficulty levels but keep most questions relatively easy
+        5. For each question, also provide a brief explanation of the correct answer that can be shown to the patient
+        6. Format each question using the following structure:
+        
+        Q1: [Question text]
+        A. [First option]
+        B. [Second option]
+        C. [Third option]
+        D. [Fourth option]
+        CORRECT: [Correct option letter]
+        EXPLANATION: [Brief explanation]
+        CATEGORY: [Category of memory being tested: personal, temporal, spatial, factual, etc.]
+        
+        Return only the formatted questions without any other text.
+        """
+
+# Fixed pieces of the quiz prompt; only the patient details and the memory and
+# conversation slots vary between calls
+QUIZ_PROMPT_PREAMBLE = """
+        You are a cognitive health assistant creating a personalized memory quiz for {patient_name}, 
+        who is an Alzheimer's or dementia patient. This quiz will help exercise their memory recall.
+        
+        Please create {question_count} multiple-choice questions based on the following information 
+        about {patient_name}:
+        
+        """
+QUIZ_MEMORY_HEADER = """
+            MEMORIES:
+            """
+QUIZ_CONVERSATION_HEADER = """
+            RECENT CONVERSATIONS:
+            """
+QUIZ_SECTION_END = """
+            """
+QUIZ_GENERAL_SECTION = """
+            This should be a general knowledge quiz with simple questions that most older adults 
+            would know, focusing on long-term memory recall rather than recent events.
+            """
+
+# Tagged lines of a quiz response: question, option, answer, explanation, category
+QUIZ_LINE_RE = re.compile(
+    r'^[ \t]*(Q\d+:|[ABCD]\.|CORRECT:|EXPLANATION:|CATEGORY:)(.*)$',
+    re.MULTILINE)
+
+
+def _row_norms(matrix: np.ndarray) -> np.ndarray:
+    """L2 norm of each row, in one pass without a squared temporary"""
+    return np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+
+
+def _cuda_torch():
+    """The torch module if a CUDA device is usable, otherwise None"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch if torch.cuda.is_available() else None
+
 
 class MementoQuizSystem:
     """Quiz generation system for Memento app using RAG to create personalized memory quizzes"""
@@ -26,9 +131,20 @@ class MementoQuizSystem:
 
             # Initialize models
             self.embedding_model = TextEmbeddingModel.from_pretrained(
-                "textembedding-gecko@latest")
+                EMBEDDING_MODEL_NAME)
             self.gemini_model = GenerativeModel("gemini-pro")
 
+            # Thread pool for running independent Firestore requests concurrently
+            self._executor = ThreadPoolExecutor(max_workers=IO_WORKERS,
+                                                thread_name_prefix="quiz-io")
+
+            # PyTorch for large fallback similarity searches (None without a GPU)
+            self._torch = _cuda_torch()
+
+            # Memoize embeddings so recurring texts skip the Vertex AI call
+            self._embedding_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+            self._embedding_cache_lock = threading.Lock()
+
             # Get Firestore client - use the provided one or import from firebase_init
             if db is not None:
                 self.db = db
@@ -46,8 +162,28 @@ class MementoQuizSystem:
 
     def generate_embedding(self, text: str) -> List[float]:
         """Generate text embeddings using Vertex AI"""
-        embeddings = self.embedding_model.get_embeddings([text])
-        return embeddings[0].values
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts in as few Vertex AI calls as possible"""
+        with self._embedding_cache_lock:
+            found = {
+                text: self._embedding_cache[text]
+                for text in texts if text in self._embedding_cache
+            }
+
+        # Only texts that aren't cached are sent, in batches of the most the
+        # model accepts per request
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+            batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+            embeddings = self.embedding_model.get_embeddings(batch)
+            with self._embedding_cache_lock:
+                for text, embedding in zip(batch, embeddings):
+                    found[text] = tuple(embedding.values)
+                    self._embedding_cache[text] = found[text]
+
+        return [list(found[text]) for text in texts]
 
     def retrieve_memories(self,
                           patient_id: str,
@@ -56,6 +192,28 @@ class MementoQuizSystem:
         """Retrieve relevant memories for a patient based on query text"""
         # Generate query embedding
         query_embedding = self.generate_embedding(query_text)
+        return self._retrieve_by_embeddings(patient_id, [query_embedding],
+                                            limit)[0]
+
+    def retrieve_memories_batch(self,
+                                patient_id: str,
+                                query_texts: List[str],
+                                limit: int = 5) -> List[List[Dict[str, Any]]]:
+        """Retrieve relevant memories for several query texts at once
+
+        Returns one list of memories per query text, in the same order.
+        """
+        # Generate all query embeddings with a single request
+        query_embeddings = self.generate_embeddings(query_texts)
+        return self._retrieve_by_embeddings(patient_id, query_embeddings,
+                                            limit)
+
+    def _retrieve_by_embeddings(
+            self, patient_id: str, query_embeddings: List[List[float]],
+            limit: int) -> List[List[Dict[str, Any]]]:
+        """Find the closest memory chunks for each query embedding"""
+        if not query_embeddings:
+            return []
 
         try:
             # Try using Firestore's vector search
@@ -66,68 +224,75 @@ class MementoQuizSystem:
             chunks_ref = self.db.collection("patientMemoryVectors").document(
                 patient_id).collection("chunks")
 
-            # Perform vector search
-            vector_query = chunks_ref.find_nearest(
-                vector_field="vector",
-                query_vector=Vector(query_embedding),
-                distance_measure=DistanceMeasure.COSINE,
-                limit=limit)
-
-            # Get the results
-            results = vector_query.stream()
-
-            memories = []
-            for doc in results:
-                memory = doc.to_dict()
-                # Add the similarity score
-                if hasattr(doc, 'distance'):
-                    memory["similarity"] = 1.0 - doc.distance
-                else:
-                    memory["similarity"] = 0.0
-                memories.append(memory)
-
-            return memories
+            all_memories = []
+            for query_embedding in query_embeddings:
+                # Perform vector search
+                vector_query = chunks_ref.find_nearest(
+                    vector_field="vector",
+                    query_vector=Vector(query_embedding),
+                    distance_measure=DistanceMeasure.COSINE,
+                    limit=limit)
+
+                # Get the results
+                results = vector_query.stream()
+
+                memories = []
+                for doc in results:
+                    memory = doc.to_dict()
+                    for field in VECTOR_FIELDS:
+                        memory.pop(field, None)
+                    # Add the similarity score
+                    if hasattr(doc, 'distance'):
+                        memory["similarity"] = 1.0 - doc.distance
+                    else:
+                        memory["similarity"] = 0.0
+                    memories.append(memory)
+                all_memories.append(memories)
+
+            return all_memories
 
         except (ImportError, AttributeError) as e:
             # Fall back to manual similarity calculation
             print(f"Firestore vector search not available: {e}")
             print("Falling back to manual similarity...")
 
-            # Get all memories for the patient
-            memories_ref = self.db.collection("patientMemoryVectors").document(
-                patient_id).collection("chunks")
-            memories = list(memories_ref.stream())
-
-            # Calculate similarity for each memory
-            memory_scores = []
-            for memory_doc in memories:
-                memory = memory_doc.to_dict()
-                memory_vector = memory.get("vector")
-
-                # Skip memories without a vector
-                if not memory_vector:
+            # An empty or zero query matches nothing
+            query_matrix = np.asarray(query_embeddings, dtype=np.float32)
+            query_norms = _row_norms(query_matrix)
+            valid_queries = np.isfinite(query_norms) & (query_norms > 0)
+            if not valid_queries.any():
+                return [[] for _ in query_embeddings]
+            query_norms[~valid_queries] = 1.0
+
+            # Read the int8 copy of each memory vector, as the RAG fallback
+            # does; the chunks come back without any vector fields
+            query_dimension = len(query_embeddings[0])
+            matrix_i8, scales, memories = load_memory_chunks(
+                self.db, patient_id, query_dimension, self.generate_embedding)
+
+            k = min(limit, len(memories))
+            if k <= 0:
+                return [[] for _ in query_embeddings]
+
+            # Calculate cosine similarity for all memories and queries in one
+            # matmul; the dequantized rows are unit-length, so only the
+            # queries need normalizing
+            memory_matrix = matrix_i8.astype(np.float32) * scales[:, None]
+            query_matrix /= query_norms[:, None]
+            all_sims = self._similarity_matrix(memory_matrix, query_matrix)
+
+            all_memories = []
+            for sims, valid in zip(all_sims.T, valid_queries):
+                if not valid:
+                    all_memories.append([])
                     continue
-
-                # Calculate cosine similarity
-                import numpy as np
-                memory_vector = np.array(memory_vector)
-                query_vector = np.array(query_embedding)
-
-                try:
-                    similarity = np.dot(memory_vector, query_vector) / (
-                        np.linalg.norm(memory_vector) *
-                        np.linalg.norm(query_vector))
-
-                    # Add to list with similarity score
-                    memory["similarity"] = float(similarity)
-                    memory_scores.append(memory)
-                except ValueError as e:
-                    print(f"Error calculating similarity: {e}")
-                    continue
-
-            # Sort by similarity (highest first) and take top results
-            memory_scores.sort(key=lambda x: x["similarity"], reverse=True)
-            return memory_scores[:limit]
+                # Take top results, highest similarity first
+                top_idx = _top_k_indices(sims, k)
+                all_memories.append([
+                    dict(memories[i], similarity=float(sims[i]))
+                    for i in top_idx
+                ])
+            return all_memories
 
     def retrieve_conversations(self,
                                patient_id: str,
@@ -135,37 +300,66 @@ class MementoQuizSystem:
                                count_limit: int = 20) -> List[Dict[str, Any]]:
         """Retrieve recent conversations for a patient"""
         try:
-            # Get conversation collection
-            conv_ref = self.db.collection("conversations").document(patient_id)
-            conv_doc = conv_ref.get()
-
-            if not conv_doc.exists:
-                return []
-
-            # Get messages
-            all_messages = conv_doc.to_dict().get("messages", [])
+            # Messages live in a subcollection so Firestore can filter, sort
+            # and limit them instead of returning the whole history
+            messages_ref = self.db.collection("conversations").document(
+                patient_id).collection("messages")
 
             # Filter by date if needed
+            query = messages_ref
             if days_limit > 0:
-                cutoff_date = datetime.now() - datetime.timedelta(
-                    days=days_limit)
-                filtered_messages = [
-                    msg for msg in all_messages
-                    if 'timestamp' in msg and msg['timestamp'] >= cutoff_date
-                ]
-            else:
-                filtered_messages = all_messages
+                cutoff_date = datetime.now() - timedelta(days=days_limit)
+                query = query.where("timestamp", ">=", cutoff_date)
 
             # Sort by timestamp (newest first) and limit count
-            filtered_messages.sort(
-                key=lambda x: x.get('timestamp', datetime.min), reverse=True)
+            query = query.order_by("timestamp",
+                                   direction="DESCENDING").limit(count_limit)
 
-            return filtered_messages[:count_limit]
+            return [doc.to_dict() for doc in query.stream()]
 
         except Exception as e:
             print(f"Error retrieving conversations: {e}")
             return []
 
+    def _sample_memories(self, patient_id: str,
+                         count: int) -> List[Dict[str, Any]]:
+        """
+        Fetch up to `count` random memories for a patient
+
+        Each memory carries a random `randKey`; starting from a random pivot
+        and wrapping around reads only `count` documents instead of the
+        patient's whole memory bank.
+        """
+        items_ref = self.db.collection("patientMemories").document(
+            patient_id).collection("items")
+        pivot = random.random()
+
+        docs = list(
+            items_ref.where("randKey", ">=", pivot).order_by("randKey").limit(
+                count).stream())
+        if len(docs) < count:
+            docs += list(
+                items_ref.where("randKey", "<", pivot).order_by(
+                    "randKey").limit(count - len(docs)).stream())
+
+        return [doc.to_dict() for doc in docs]
+
+    def _similarity_matrix(self, memory_matrix: np.ndarray,
+                           query_matrix: np.ndarray) -> np.ndarray:
+        """(N, queries) dot products, computed on the GPU for large N"""
+        torch = self._torch
+        if torch is None or len(memory_matrix) < GPU_MIN_ROWS:
+            return memory_matrix @ query_matrix.T
+
+        # Casting to half precision on the host halves the host-to-device
+        # transfer and uses the tensor cores; results come back as float32
+        # for ranking
+        memories = torch.from_numpy(
+            memory_matrix.astype(np.float16)).to("cuda")
+        queries = torch.from_numpy(query_matrix.astype(np.float16)).to("cuda")
+        sims = torch.matmul(memories, queries.T)
+        return sims.float().cpu().numpy()
+
     def generate_quiz(self,
                       patient_id: str,
                       quiz_type: str = "mixed",
@@ -182,9 +376,23 @@ class MementoQuizSystem:
             Dictionary containing quiz data
         """
         try:
+            # Start the patient, memory and conversation reads together
+            patient_future = self._executor.submit(
+                self.db.collection("users").document(patient_id).get)
+            memory_future = None
+            if quiz_type in ["memory", "mixed"]:
+                memory_future = self._executor.submit(
+                    self._sample_memories, patient_id, MEMORY_SAMPLE_SIZE)
+            conversation_future = None
+            if quiz_type in ["conversation", "mixed"]:
+                conversation_future = self._executor.submit(
+                    self.retrieve_conversations,
+                    patient_id,
+                    days_limit=30,
+                    count_limit=50)
+
             # Get patient info
-            patient_doc = self.db.collection("users").document(
-                patient_id).get()
+            patient_doc = patient_future.result()
             if not patient_doc.exists:
                 return {"error": "Patient not found"}
 
@@ -196,37 +404,27 @@ class MementoQuizSystem:
             conversations = []
 
             # Get memories based on quiz type
-            if quiz_type in ["memory", "mixed"]:
+            sampled_ids = set()
+            if memory_future is not None:
                 # Retrieve some random memories as seeds
-                memory_docs = self.db.collection("patientMemories").document(
-                    patient_id).get().to_dict()
-
-                if memory_docs and "memories" in memory_docs:
-                    all_memories = memory_docs["memories"]
-                    # Take up to 10 random memories
-                    import random
-                    sample_size = min(10, len(all_memories))
-                    memory_samples = random.sample(all_memories, sample_size)
-
-                    for memory in memory_samples:
-                        memories.append({
-                            "title":
-                            memory.get("title", ""),
-                            "content":
-                            memory.get("content", ""),
-                            "type":
-                            memory.get("metadata", {}).get("type", "memory"),
-                            "people":
-                            memory.get("metadata", {}).get("people", []),
-                            "places":
-                            memory.get("metadata", {}).get("places", [])
-                        })
+                for memory in memory_future.result():
+                    sampled_ids.add(memory.get("id"))
+                    memories.append({
+                        "title":
+                        memory.get("title", ""),
+                        "content":
+                        memory.get("content", ""),
+                        "type":
+                        memory.get("metadata", {}).get("type", "memory"),
+                        "people":
+                        memory.get("metadata", {}).get("people", []),
+                        "places":
+                        memory.get("metadata", {}).get("places", [])
+                    })
 
             # Get conversations based on quiz type
-            if quiz_type in ["conversation", "mixed"]:
-                recent_messages = self.retrieve_conversations(patient_id,
-                                                              days_limit=30,
-                                                              count_limit=50)
+            if conversation_future is not None:
+                recent_messages = conversation_future.result()
 
                 # Process messages to extract relevant information
                 user_messages = [
@@ -242,6 +440,18 @@ class MementoQuizSystem:
                         "topics": msg.get("topics", [])
                     })
 
+            # Mixed quizzes also cover the memories most related to what the
+            # patient talked about recently, with one embedding request for
+            # all of the seed messages
+            if quiz_type == "mixed":
+                seed_queries = [
+                    convo["content"] for convo in conversations
+                    if convo["content"]
+                ][:QUIZ_SEED_QUERIES]
+                memories.extend(
+                    self._related_memories(patient_id, seed_queries,
+                                           sampled_ids))
+
             # Prepare prompt for quiz generation
             prompt = self._create_quiz_prompt(first_name, memories,
                                               conversations, quiz_type,
@@ -261,6 +471,8 @@ class MementoQuizSystem:
                 "quizType": quiz_type,
                 "createdAt": datetime.now(),
                 "questions": quiz_data,
+                "answeredCount": 0,
+                "correctCount": 0,
                 "status": "active",
                 "patientName": first_name
             }
@@ -281,76 +493,81 @@ class MementoQuizSystem:
             traceback.print_exc()
             return {"error": str(e)}
 
-    def _create_quiz_prompt(self, patient_name: str, memories: List[Dict[str,
-                                                                         Any]],
-                            conversations: List[Dict[str, Any]],
-                            quiz_type: str, question_count: int) -> str:
-        """Create a prompt for quiz generation"""
+    def _related_memories(self, patient_id: str, seed_queries: List[str],
+                          exclude_ids: set) -> List[Dict[str, Any]]:
+        """Memory chunks closest to the seed queries, as quiz prompt memories"""
+        if not seed_queries:
+            return []
+        try:
+            results = self.retrieve_memories_batch(patient_id, seed_queries,
+                                                   MEMORIES_PER_SEED_QUERY)
+        except Exception as e:
+            print(f"Error retrieving related memories: {e}")
+            return []
 
-        # Prepare memories context
-        memory_context = ""
-        for i, memory in enumerate(memories):
-            memory_context += f"Memory {i+1}. Title: {memory.get('title', 'Untitled')}\n"
-            memory_context += f"Content: {memory.get('content', '')}\n"
-            memory_context += f"People mentioned: {', '.join(memory.get('people', []))}\n"
-            memory_context += f"Places mentioned: {', '.join(memory.get('places', []))}\n\n"
-
-        # Prepare conversations context
-        conversation_context = ""
-        for i, convo in enumerate(conversations):
-            conversation_context += f"Conversation {i+1}: {convo.get('content', '')}\n"
-            if convo.get('topics'):
-                conversation_context += f"Topics: {', '.join(convo.get('topics', []))}\n"
-            conversation_context += "\n"
-
-        # Build the prompt
-        prompt = f"""
-        You are a cognitive health assistant creating a personalized memory quiz for {patient_name}, 
-        who is an Alzheimer's or dementia patient. This quiz will help exercise their memory recall.
-        
-        Please create {question_count} multiple-choice questions based on the following information 
-        about {patient_name}:
-        
-        """
+        related = []
+        seen = set(exclude_ids)
+        for chunks in results:
+            for chunk in chunks:
+                source_id = chunk.get("sourceId")
+                if source_id in seen:
+                    continue
+                seen.add(source_id)
+                # Chunk summaries are written as "<title>: <content>"
+                title, _, content = chunk.get("summary", "").partition(": ")
+                metadata = chunk.get("metadata", {})
+                related.append({
+                    "title": title,
+                    "content": content,
+                    "type": metadata.get("type", "memory"),
+                    "people": metadata.get("people", []),
+                    "places": metadata.get("places", [])
+                })
+        return related
 
-        if quiz_type == "memory" or quiz_type == "mixed":
-            prompt += f"""
-            MEMORIES:
-            {memory_context}
-            """
+    def _create_quiz_prompt(self,
+                            patient_name: str,
+                            memories: List[Dict[str, Any]],
+                            conversations: List[Dict[str, Any]],
+                            quiz_type: str,
+                            question_count: int) -> str:
+        """Create a prompt for quiz generation"""
 
-        if quiz_type == "conversation" or quiz_type == "mixed":
-            prompt += f"""
-            RECENT CONVERSATIONS:
-            {conversation_context}
-            """
+        # Only the slots used by this quiz type are rendered; the fixed text
+        # around them is spliced in from the precomputed template pieces
+        parts = [
+            QUIZ_PROMPT_PREAMBLE.format(patient_name=patient_name,
+                                        question_count=question_count)
+        ]
+
+        if quiz_type in ("memory", "mixed"):
+            parts.append(QUIZ_MEMORY_HEADER)
+            for i, memory in enumerate(memories, 1):
+                people = ', '.join(memory.get('people', []))
+                places = ', '.join(memory.get('places', []))
+                parts.append(
+                    f"Memory {i}. Title: {memory.get('title', 'Untitled')}\n"
+                    f"Content: {memory.get('content', '')}\n"
+                    f"People mentioned: {people}\n"
+                    f"Places mentioned: {places}\n\n")
+            parts.append(QUIZ_SECTION_END)
+
+        if quiz_type in ("conversation", "mixed"):
+            parts.append(QUIZ_CONVERSATION_HEADER)
+            for i, convo in enumerate(conversations, 1):
+                parts.append(f"Conversation {i}: {convo.get('content', '')}\n")
+                topics = convo.get('topics')
+                if topics:
+                    parts.append(f"Topics: {', '.join(topics)}\n")
+                parts.append("\n")
+            parts.append(QUIZ_SECTION_END)
 
         if quiz_type == "general":
-            prompt += f"""
-            This should be a general knowledge quiz with simple questions that most older adults 
-            would know, focusing on long-term memory recall rather than recent events.
-            """
+            parts.append(QUIZ_GENERAL_SECTION)
 
-        prompt += f"""
-        INSTRUCTIONS:
-        1. Create {question_count} multiple-choice questions that would help exercise {patient_name}'s memory
-        2. Each question should have 4 possible answers, with only one being correct
-        3. Questions should be gentle and supportive, not frustrating
-        4. Include a mix of difficulty levels but keep most questions relatively easy
-        5. For each question, also provide a brief explanation of the correct answer that can be shown to {patient_name}
-        6. Format each question using the following structure:
-        
-        Q1: [Question text]
-        A. [First option]
-        B. [Second option]
-        C. [Third option]
-        D. [Fourth option]
-        CORRECT: [Correct option letter]
-        EXPLANATION: [Brief explanation]
-        CATEGORY: [Category of memory being tested: personal, temporal, spatial, factual, etc.]
-        
-        Return only the formatted questions without any other text.
-        """
+        parts.append(QUIZ_INSTRUCTIONS)
+
+        prompt = "".join(parts)
 
         return prompt
 
@@ -360,16 +577,14 @@ class MementoQuizSystem:
         questions = []
         current_question = {}
 
-        # Split the response into lines
-        lines = response_text.strip().split('\n')
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+        # Only lines starting with a known tag are matched; everything else
+        # is skipped by the regex engine
+        for match in QUIZ_LINE_RE.finditer(response_text):
+            tag = match.group(1)
+            value = match.group(2).strip()
 
             # Parse question
-            if line.startswith('Q') and ':' in line:
+            if tag[0] == 'Q':
                 # Save the previous question if it exists
                 if current_question and 'text' in current_question:
                     questions.append(current_question)
@@ -377,34 +592,28 @@ class MementoQuizSystem:
                 # Start a new question
                 current_question = {
                     'options': [],
-                    'text': line.split(':', 1)[1].strip(),
+                    'text': value,
                     'id': str(uuid.uuid4())
                 }
 
             # Parse options
-            elif line.startswith(('A.', 'B.', 'C.', 'D.')):
-                option_letter = line[0]
-                option_text = line[2:].strip()
+            elif len(tag) == 2:
                 current_question.setdefault('options', []).append({
-                    'id':
-                    option_letter,
-                    'text':
-                    option_text
+                    'id': tag[0],
+                    'text': value
                 })
 
             # Parse correct answer
-            elif line.startswith('CORRECT:'):
-                current_question['correctAnswer'] = line.split(':',
-                                                               1)[1].strip()
+            elif tag == 'CORRECT:':
+                current_question['correctAnswer'] = value
 
             # Parse explanation
-            elif line.startswith('EXPLANATION:'):
-                current_question['explanation'] = line.split(':', 1)[1].strip()
+            elif tag == 'EXPLANATION:':
+                current_question['explanation'] = value
 
             # Parse category
-            elif line.startswith('CATEGORY:'):
-                current_question['category'] = line.split(
-                    ':', 1)[1].strip().lower()
+            else:
+                current_question['category'] = value.lower()
 
         # Add the last question
         if current_question and 'text' in current_question:
@@ -425,10 +634,15 @@ class MementoQuizSystem:
         Returns:
             Dictionary with answer result
         """
-        try:
-            # Get the quiz session
-            quiz_ref = self.db.collection("gameSessions").document(quiz_id)
-            quiz_doc = quiz_ref.get()
+        quiz_ref = self.db.collection("gameSessions").document(quiz_id)
+
+        # The duplicate check, counters, completion and the patient's scores
+        # are all read and written in one transaction, so concurrent answers
+        # can't double-count or miss the quiz's completion. Firestore reruns
+        # the function if a document changes before the commit.
+        @firestore.transactional
+        def record_in_transaction(transaction):
+            quiz_doc = quiz_ref.get(transaction=transaction)
 
             if not quiz_doc.exists:
                 return {"error": "Quiz session not found"}
@@ -437,19 +651,17 @@ class MementoQuizSystem:
 
             # Find the question
             questions = quiz_data.get("questions", [])
-            question = next(
-                (q for q in questions if q.get("id") == question_id), None)
+            questions_by_id = {q.get("id"): q for q in questions}
+            question = questions_by_id.get(question_id)
 
             if not question:
                 return {"error": "Question not found in this quiz"}
 
             # Check if this question has already been answered
             answers = quiz_data.get("answers", [])
-            existing_answer = next(
-                (a for a in answers if a.get("questionId") == question_id),
-                None)
+            answered_ids = {a.get("questionId") for a in answers}
 
-            if existing_answer:
+            if question_id in answered_ids:
                 return {"error": "This question has already been answered"}
 
             # Record the answer
@@ -464,57 +676,96 @@ class MementoQuizSystem:
                 "timestamp": datetime.now()
             }
 
-            # Update the quiz session
-            answers.append(answer_record)
-            quiz_ref.update({"answers": answers})
+            # Counts after this answer (sessions created before the
+            # counters existed fall back to counting the answers)
+            answered_count = quiz_data.get("answeredCount", len(answers)) + 1
+            correct_count = quiz_data.get(
+                "correctCount",
+                sum(1 for a in answers if a.get("isCorrect", False)))
+            correct_count += int(is_correct)
+
+            # Only the new answer is sent, appended on the server
+            quiz_update = {
+                "answers": firestore.ArrayUnion([answer_record]),
+                "answeredCount": answered_count,
+                "correctCount": correct_count
+            }
 
             # Check if all questions have been answered
-            if len(answers) == len(questions):
+            all_answered = answered_count >= len(questions)
+            user_ref = None
+            user_update = None
+            if all_answered:
                 # Calculate score
-                correct_count = sum(1 for a in answers
-                                    if a.get("isCorrect", False))
                 score = int((correct_count / len(questions)) * 100)
-
-                # Update quiz status and score
-                quiz_ref.update({
+                quiz_update.update({
                     "status": "completed",
                     "completedAt": datetime.now(),
                     "score": score
                 })
 
-                # Update patient's memory score in user profile (optional)
+                # Update patient's memory score in user profile (optional).
+                # All reads have to happen before the transaction's writes.
                 patient_id = quiz_data.get("patientId")
                 if patient_id:
-                    # Get recent quiz scores (last 5)
-                    recent_quizzes = self.db.collection("gameSessions") \
-                        .where("patientId", "==", patient_id) \
-                        .where("status", "==", "completed") \
-                        .order_by("completedAt", direction="DESCENDING") \
-                        .limit(5) \
-                        .stream()
-
-                    scores = [
-                        q.to_dict().get("score", 0) for q in recent_quizzes
-                    ]
-                    avg_score = sum(scores) / len(scores) if scores else 0
-
-                    # Update user's memory score
-                    self.db.collection("users").document(patient_id).update(
-                        {"memoryScore": int(avg_score)})
+                    user_ref = self.db.collection("users").document(patient_id)
+                    user_doc = user_ref.get(transaction=transaction)
+                    if user_doc.exists:
+                        recent_scores = user_doc.to_dict().get(
+                            "recentQuizScores")
+                        if recent_scores is None:
+                            # Profiles from before the scores were kept on
+                            # the user document: seed them from the quiz
+                            # history
+                            recent_scores = self._recent_quiz_scores(
+                                patient_id, quiz_id, RECENT_SCORES_WINDOW - 1)
+                            recent_scores.reverse()
+
+                        # Average over this quiz and the previous ones (last 5)
+                        scores = (recent_scores +
+                                  [score])[-RECENT_SCORES_WINDOW:]
+                        avg_score = sum(scores) / len(scores)
+                        user_update = {
+                            "recentQuizScores": scores,
+                            "memoryScore": int(avg_score)
+                        }
+
+            transaction.update(quiz_ref, quiz_update)
+            if user_update is not None:
+                transaction.update(user_ref, user_update)
 
             # Return the result
             return {
                 "isCorrect": is_correct,
                 "correctOption": correct_option,
                 "explanation": question.get("explanation", ""),
-                "allQuestionsAnswered": len(answers) == len(questions)
+                "allQuestionsAnswered": all_answered
             }
 
+        try:
+            return record_in_transaction(self.db.transaction())
+
         except Exception as e:
             import traceback
             traceback.print_exc()
             return {"error": str(e)}
 
+    def _recent_quiz_scores(self, patient_id: str, exclude_quiz_id: str,
+                            count: int) -> List[int]:
+        """Scores of a patient's most recent completed quizzes (newest first), excluding one quiz"""
+        recent_quizzes = self.db.collection("gameSessions") \
+            .where("patientId", "==", patient_id) \
+            .where("status", "==", "completed") \
+            .order_by("completedAt", direction="DESCENDING") \
+            .limit(count + 1) \
+            .stream()
+
+        scores = [
+            q.to_dict().get("score", 0) for q in recent_quizzes
+            if q.id != exclude_quiz_id
+        ]
+        return scores[:count]
+
     def get_quiz_session(self, quiz_id: str) -> Dict[str, Any]:
         """
         Get the details of a quiz session
@@ -568,80 +819,62 @@ class MementoQuizSystem:
             Dictionary with quiz history data
         """
         try:
-            # Query for quiz sessions
-            quiz_query = self.db.collection("gameSessions") \
-                .where("patientId", "==", patient_id) \
-                .order_by("createdAt", direction="DESCENDING") \
-                .limit(limit)
-
-            quiz_docs = quiz_query.stream()
+            sessions_ref = self.db.collection("gameSessions")
+            patient_sessions = sessions_ref.where("patientId", "==",
+                                                  patient_id)
+            completed_sessions = patient_sessions.where(
+                "status", "==", "completed")
+
+            # The four queries are independent, so issue them together and
+            # wait for the slowest instead of paying each round trip in turn
+            quiz_future = self._executor.submit(
+                lambda: list(
+                    patient_sessions.order_by("createdAt",
+                                              direction="DESCENDING").limit(
+                                                  limit).stream()))
+            total_future = self._executor.submit(patient_sessions.count().get)
+            completed_future = self._executor.submit(
+                completed_sessions.count().get)
+            # Only the three trend fields are needed, so project them out
+            # rather than transferring whole sessions with their questions
+            score_future = self._executor.submit(lambda: list(
+                completed_sessions.order_by("completedAt").select(
+                    ["score", "completedAt", "quizType"]).limit(20).stream()))
 
             # Process results
             quizzes = []
-            for doc in quiz_docs:
-                quiz_data = doc.to_dict()
-
-                # Clean up timestamps for JSON serialization
-                if "createdAt" in quiz_data and isinstance(
-                        quiz_data["createdAt"], datetime):
-                    quiz_data["createdAt"] = quiz_data["createdAt"].isoformat()
-                if "completedAt" in quiz_data and isinstance(
-                        quiz_data["completedAt"], datetime):
-                    quiz_data["completedAt"] = quiz_data[
-                        "completedAt"].isoformat()
+            append_quiz = quizzes.append
+            for doc in quiz_future.result():
+                get = doc.to_dict().get
 
                 # Simplify the data structure for the list view
-                simplified_quiz = {
-                    "id": quiz_data.get("id"),
-                    "quizType": quiz_data.get("quizType"),
-                    "createdAt": quiz_data.get("createdAt"),
-                    "completedAt": quiz_data.get("completedAt"),
-                    "status": quiz_data.get("status"),
-                    "score": quiz_data.get("score", 0),
-                    "questionCount": len(quiz_data.get("questions", [])),
-                    "answeredCount": len(quiz_data.get("answers", []))
-                }
-
-                quizzes.append(simplified_quiz)
+                append_quiz({
+                    "id": get("id"),
+                    "quizType": get("quizType"),
+                    "createdAt": get("createdAt"),
+                    "completedAt": get("completedAt"),
+                    "status": get("status"),
+                    "score": get("score", 0),
+                    "questionCount": len(get("questions", ())),
+                    "answeredCount": len(get("answers", ()))
+                })
 
             # Get some statistics
-            total_quizzes_query = self.db.collection("gameSessions") \
-                .where("patientId", "==", patient_id) \
-                .count()
-
-            total_quizzes = total_quizzes_query.get()[0][0]
-
-            completed_quizzes_query = self.db.collection("gameSessions") \
-                .where("patientId", "==", patient_id) \
-                .where("status", "==", "completed") \
-                .count()
-
-            completed_quizzes = completed_quizzes_query.get()[0][0]
+            total_quizzes = total_future.result()[0][0].value
+            completed_quizzes = completed_future.result()[0][0].value
 
             # Calculate score trends if there are completed quizzes
             score_trends = []
             if completed_quizzes > 0:
-                score_query = self.db.collection("gameSessions") \
-                    .where("patientId", "==", patient_id) \
-                    .where("status", "==", "completed") \
-                    .order_by("completedAt") \
-                    .limit(20) \
-                    .stream()
+                score_query = score_future.result()
 
                 for doc in score_query:
                     quiz_data = doc.to_dict()
                     if "score" in quiz_data and "completedAt" in quiz_data:
-                        completed_at = quiz_data["completedAt"]
-                        if isinstance(completed_at, datetime):
-                            completed_at = completed_at.isoformat()
-
                         score_trends.append({
-                            "date":
-                            completed_at,
-                            "score":
-                            quiz_data["score"],
-                            "quizType":
-                            quiz_data.get("quizType")
+                            "date": quiz_data["completedAt"],
+                            "score": quiz_data["score"],
+                            "quizType": quiz_data.get("quizType")
                         })
 
             return {
@@ -655,3 +888,106 @@ class MementoQuizSystem:
             import traceback
             traceback.print_exc()
             return {"error": str(e)}
+
+    def get_patient_quiz_stats(self,
+                               patient_id: str,
+                               days: int = 30) -> Dict[str, Any]:
+        """
+        Get quiz statistics for a patient
+        
+        Args:
+            patient_id: ID of the patient
+            days: Number of days to include in statistics
+            
+        Returns:
+            Dictionary with quiz statistics
+        """
+        try:
+            # Calculate time window
+            start_date = datetime.now() - timedelta(days=days)
+
+            # Completed quizzes in the time window
+            window_query = self.db.collection("gameSessions") \
+                .where("patientId", "==", patient_id) \
+                .where("status", "==", "completed") \
+                .where("completedAt", ">=", start_date)
+
+            # Counts and averages are computed by Firestore, so only the
+            # aggregate values cross the wire instead of every session. The
+            # overall totals come first: patients with no quizzes in the
+            # window are answered from this single aggregation
+            total_quizzes, avg_score = self._count_and_average(window_query)
+            if total_quizzes == 0:
+                return {
+                    "totalQuizzes": 0,
+                    "averageScore": 0,
+                    "quizzesByType": {},
+                    "scoresByType": {},
+                    "recentScores": [],
+                    "scoreTrend": []
+                }
+
+            # The per-type aggregations and the trend read are independent,
+            # so they run together
+            type_futures = [
+                self._executor.submit(
+                    self._count_and_average,
+                    window_query.where("quizType", "==", quiz_type))
+                for quiz_type in QUIZ_TYPES
+            ]
+            # Only the most recent quizzes are read for the trend, projected
+            # to the trend fields so questions and answers stay on the server
+            recent_future = self._executor.submit(lambda: list(
+                window_query.order_by("completedAt",
+                                      direction="DESCENDING").select(
+                                          ["quizType", "score", "completedAt"
+                                           ]).limit(STATS_TREND_LIMIT).stream()))
+
+            # Quizzes by type
+            quizzes_by_type = {}
+            avg_scores_by_type = {}
+            for quiz_type, future in zip(QUIZ_TYPES, type_futures):
+                count, average = future.result()
+                if count:
+                    quizzes_by_type[quiz_type] = count
+                    avg_scores_by_type[quiz_type] = average
+
+            # Trend entries and recent scores are filled in one pass over the
+            # newest-first results, already ordered by Firestore
+            score_trend = []
+            recent_scores = []
+            for doc in reversed(recent_future.result()):
+                get = doc.to_dict().get
+                score = get("score", 0)
+
+                score_trend.append({
+                    "date": get("completedAt"),
+                    "score": score,
+                    "type": get("quizType", "unknown")
+                })
+                recent_scores.append(score)
+
+            return {
+                "totalQuizzes": total_quizzes,
+                "averageScore": round(avg_score, 1),
+                "quizzesByType": quizzes_by_type,
+                "scoresByType": avg_scores_by_type,
+                "recentScores": recent_scores,
+                "scoreTrend": score_trend
+            }
+
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _count_and_average(self, query) -> Tuple[int, float]:
+        """
+        Count the sessions matching a query and average their scores with a
+        single Firestore aggregation query
+
+        Returns:
+            Tuple of (count, average score)
+        """
+        results = query.count(alias="count").avg("score",
+                                                 alias="average").get()
+        values = {result.alias: result.value for result in results[0]}
+        return int(values["count"]), values["average"] or 0
@@ -1,14 +1,25 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from firebase_admin import auth
 from datetime import datetime, timedelta
 import jwt
 import json
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from types import SimpleNamespace
+import base64
+import hashlib
+import hmac
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 import os
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 from ..db.firebase import db
+from .schemas import LoginBody, SignupBody, parse_body
+from .tokens import TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL, token_cache_key
 
 # Load environment variables
 load_dotenv()
@@ -23,36 +34,89 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Our tokens are a few hundred bytes; anything far larger is rejected before
+# any decoding work is done
+MAX_TOKEN_LENGTH = 4096
+REQUIRED_CLAIMS = {"require": ["exp", "sub", "type"], "verify_signature": True}
+
+# Verified access tokens, so repeat requests skip decoding (cache settings and
+# key shared with the ID token cache of the other routes)
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
+# Worker threads used to overlap independent Firebase requests
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="auth-io")
+
+# Shared HTTP session so Firebase Auth REST calls reuse pooled TLS connections
+FIREBASE_AUTH_TIMEOUT = 5  # seconds
+_http_session = requests.Session()
+_http_session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=50))
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+# Tokens are always HS256, so the encoded header is the same for every token
+# and the HMAC keys are set up once; each token only needs its payload
+# serialized and signed. The output is a standard JWT that jwt.decode accepts.
+_JWT_HEADER_SEGMENT = _b64url(json.dumps({"alg": ALGORITHM, "typ": "JWT"}, separators=(",", ":")).encode())
+
+def _hs256_signer(secret):
+    return hmac.new(secret.encode(), digestmod=hashlib.sha256) if secret else None
+
+_ACCESS_SIGNER = _hs256_signer(SECRET_KEY)
+_REFRESH_SIGNER = _hs256_signer(REFRESH_SECRET_KEY)
+
+def _encode_jwt(payload, signer):
+    if signer is None:
+        raise ValueError("JWT secret key is not configured")
+    signing_input = _JWT_HEADER_SEGMENT + b"." + _b64url(json.dumps(payload, separators=(",", ":")).encode())
+    mac = signer.copy()
+    mac.update(signing_input)
+    return (signing_input + b"." + _b64url(mac.digest())).decode()
+
 # JWT access token creation
 def create_access_token(data, expires_delta=None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    lifetime = int((expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)).total_seconds())
+    now = int(time.time())
+    to_encode.update({"iat": now, "exp": now + lifetime, "type": "access"})
+    return _encode_jwt(to_encode, _ACCESS_SIGNER)
 
 # JWT refresh token creation
 def create_refresh_token(data, expires_delta=None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
-    to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    lifetime = int((expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)).total_seconds())
+    now = int(time.time())
+    to_encode.update({"iat": now, "exp": now + lifetime, "type": "refresh"})
+    return _encode_jwt(to_encode, _REFRESH_SIGNER)
 
 # Token verification decorator
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            token = auth_header.split(" ")[1] if len(auth_header.split(" ")) > 1 else None
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
         
-        if not token:
+        if scheme.lower() != 'bearer' or not token:
             return jsonify({'message': 'Token is missing'}), 401
         
+        if len(token) > MAX_TOKEN_LENGTH:
+            return jsonify({'message': 'Invalid token'}), 401
+        
+        cache_key = token_cache_key(token)
+        with _token_cache_lock:
+            cached = _token_cache.get(cache_key)
+        
+        # A cached token only needs its expiry re-checked
+        if cached and cached[0].get('exp', 0) > time.time():
+            return f(cached[1], *args, **kwargs)
+        
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            # Expired tokens (e.g. from idle clients) are turned away before
+            # paying for signature verification
+            jwt.decode(token, options={"verify_signature": False, "verify_exp": True})
+            
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM],
+                                 options=REQUIRED_CLAIMS)
             
             # Verify it's an access token
             if payload.get("type") != "access":
@@ -62,8 +126,16 @@ def token_required(f):
             if not user_id:
                 return jsonify({'message': 'Invalid token'}), 401
             
-            # Get user from Firebase
-            current_user = auth.get_user(user_id)
+            # The signed claims already identify the user; routes that need the
+            # full Firebase user record can call auth.get_user themselves
+            current_user = SimpleNamespace(
+                uid=user_id,
+                email=payload.get('email'),
+                firestore_id=payload.get('firestore_id')
+            )
+            
+            with _token_cache_lock:
+                _token_cache[cache_key] = (payload, current_user)
         except jwt.PyJWTError:
             return jsonify({'message': 'Invalid token'}), 401
         except Exception as e:
@@ -76,37 +148,43 @@ def token_required(f):
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     try:
-        data = request.get_json()
+        body, error = parse_body(SignupBody)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Email and password are required, the rest is optional
+        email, password = body.email, body.password
+        username = body.username
+        display_name = body.display_name
         
         # Create user in Firebase Authentication
         user_record = auth.create_user(
-            email=data.get('email'),
-            password=data.get('password'),
-            display_name=data.get('display_name')
+            email=email,
+            password=password,
+            display_name=display_name
         )
         
         # Store additional user data in Firestore
         user_ref = db.collection('users').document(user_record.uid)
         user_ref.set({
-            'username': data.get('username'),
-            'email': data.get('email'),
-            'displayName': data.get('display_name'),
+            'username': username,
+            'email': email,
+            'displayName': display_name,
             'createdAt': datetime.now(),
-            'birthDate': data.get('birth_date'),
-            'diagnosisType': data.get('diagnosis_type'),
+            'birthDate': body.birth_date,
+            'diagnosisType': body.diagnosis_type,
             'profileImageUrl': "",
             'medicationAdherence': 0,
             'memoryScore': 0,
             'dailyQuestionsCompleted': 0,
-            'dailyQuestionsTotal': 6,
-            'reminders': []
+            'dailyQuestionsTotal': 6
         })
         
         return jsonify({
             'uid': user_record.uid,
-            'username': data.get('username'),
-            'email': data.get('email'),
-            'display_name': data.get('display_name'),
+            'username': username,
+            'email': email,
+            'display_name': display_name,
             'message': 'User created successfully'
         }), 201
     
@@ -118,14 +196,16 @@ def signup():
 @auth_bp.route('/login', methods=['POST'])
 def login():
     try:
-        data = request.get_json()
-        email = data.get('email')
-        password = data.get('password')
+        body, error = parse_body(LoginBody)
+        if error:
+            return jsonify({'error': 'Email and password required'}), 400
+        email, password = body.email, body.password
         
-        print(f"Login attempt for email: {email}")
+        log = current_app.logger
+        log.debug("Login attempt for email: %s", email)
         
         if not email or not password:
-            print("Missing email or password")
+            log.debug("Missing email or password")
             return jsonify({'error': 'Email and password required'}), 400
         
         try:
@@ -137,12 +217,13 @@ def login():
                 "returnSecureToken": True
             }
             
-            print(f"Sending request to Firebase Auth API")
-            response = requests.post(auth_url, json=auth_data)
-            print(f"Firebase Auth response status: {response.status_code}")
+            log.debug("Sending request to Firebase Auth API")
+            response = _http_session.post(auth_url, json=auth_data,
+                                          timeout=FIREBASE_AUTH_TIMEOUT)
+            log.debug("Firebase Auth response status: %s", response.status_code)
             
             if response.status_code != 200:
-                print(f"Firebase Auth error: {response.text}")
+                log.debug("Firebase Auth error: %s", response.text)
                 return jsonify({'error': 'Invalid credentials'}), 401
             
             # Authentication successful
@@ -150,12 +231,12 @@ def login():
             firebase_uid = firebase_response['localId']
             id_token = firebase_response['idToken']
             
-            print(f"Successfully authenticated user with UID: {firebase_uid}")
+            log.debug("Successfully authenticated user with UID: %s", firebase_uid)
             
-            # Look up user in Firestore by email
+            # Look up user in Firestore by email, only once the password has
+            # been accepted so failed logins don't cost a read
             users_ref = db.collection('users')
-            query = users_ref.where('email', '==', email).limit(1)
-            user_docs = query.get()
+            user_docs = users_ref.where('email', '==', email).limit(1).get()
             
             firestore_user_id = None
             
@@ -165,16 +246,16 @@ def login():
                 user_data = user_doc.to_dict()
                 firestore_user_id = user_doc.id
                 
-                print(f"Found existing user data in Firestore with ID: {firestore_user_id}")
+                log.debug("Found existing user data in Firestore with ID: %s", firestore_user_id)
                 
                 # If the document ID is different from Firebase UID, create a link
                 if firestore_user_id != firebase_uid:
                     # Update the existing document with a link to Firebase UID
                     user_doc.reference.update({'firebaseUid': firebase_uid})
-                    print(f"Updated Firestore document with Firebase UID reference")
+                    log.debug("Updated Firestore document with Firebase UID reference")
             else:
                 # No existing user found in Firestore, create new document using Firebase UID
-                print(f"No existing user found in Firestore, creating new document")
+                log.debug("No existing user found in Firestore, creating new document")
                 user_ref = db.collection('users').document(firebase_uid)
                 user_ref.set({
                     'email': email,
@@ -184,7 +265,6 @@ def login():
                     'memoryScore': 0,
                     'dailyQuestionsCompleted': 0,
                     'dailyQuestionsTotal': 6,
-                    'reminders': [],
                     'diagnosisType': ''
                 })
                 firestore_user_id = firebase_uid
@@ -212,7 +292,7 @@ def login():
                 expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
             )
             
-            print(f"Generated JWT tokens for user: {firebase_uid}")
+            log.debug("Generated JWT tokens for user: %s", firebase_uid)
             
             return jsonify({
                 'access_token': access_token,
@@ -225,21 +305,17 @@ def login():
             }), 200
         
         except auth.UserNotFoundError:
-            print(f"User not found: {email}")
+            log.debug("User not found: %s", email)
             return jsonify({'error': 'Invalid credentials'}), 401
         except requests.exceptions.RequestException as e:
-            print(f"Request error to Firebase Auth: {str(e)}")
+            log.warning("Request error to Firebase Auth: %s", e)
             return jsonify({'error': 'Authentication service unavailable'}), 503
         except Exception as e:
-            print(f"Error in Firebase Auth: {str(e)}")
-            import traceback
-            print(traceback.format_exc())  # Print the full traceback for debugging
+            log.exception("Error in Firebase Auth: %s", e)
             return jsonify({'error': f'Login error: {str(e)}'}), 500
         
     except Exception as e:
-        print(f"General login error: {str(e)}")
-        import traceback
-        print(traceback.format_exc())  # Print the full traceback for debugging
+        current_app.logger.exception("General login error: %s", e)
         return jsonify({'error': f'Login error: {str(e)}'}), 500
 
 @auth_bp.route('/refresh', methods=['POST'])
@@ -251,31 +327,43 @@ def refresh_token():
         if not refresh_token:
             return jsonify({'error': 'Refresh token required'}), 400
         
+        if len(refresh_token) > MAX_TOKEN_LENGTH:
+            return jsonify({'error': 'Invalid refresh token'}), 401
+        
         # Verify refresh token
         try:
-            payload = jwt.decode(refresh_token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
+            payload = jwt.decode(refresh_token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM],
+                                 options=REQUIRED_CLAIMS)
             
             # Check if it's a refresh token
             if payload.get("type") != "refresh":
                 return jsonify({'error': 'Invalid token type'}), 401
                 
             user_id = payload.get("sub")
+            # Refresh tokens minted before firestore_id was carried over
+            # fall back to the Firebase UID, as login does
+            firestore_id = payload.get("firestore_id") or user_id
             
-            # Get user from Firebase
+            # Get user from Firebase while the new Firebase token is created
+            firebase_token_future = _executor.submit(auth.create_custom_token, user_id)
             user = auth.get_user(user_id)
             
             # Create new Firebase token
-            firebase_token = auth.create_custom_token(user.uid)
+            firebase_token = firebase_token_future.result()
             
             # Create new access token
             access_token = create_access_token(
-                data={"sub": user.uid, "email": user.email},
+                data={
+                    "sub": user.uid,
+                    "email": user.email,
+                    "firestore_id": firestore_id
+                },
                 expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
             )
             
             # Optionally create new refresh token for rotation
             new_refresh_token = create_refresh_token(
-                data={"sub": user.uid},
+                data={"sub": user.uid, "firestore_id": firestore_id},
                 expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
             )
             
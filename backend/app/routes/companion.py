@@ -1,13 +1,25 @@
 from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, timedelta
-import base64
+import logging
+import os
+import threading
 import uuid
+from cachetools import TTLCache
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from firebase_admin import firestore
 from functools import wraps
 import json
 
 # Import the MementoRAGSystem
 from app.google_rag_system import MementoRAGSystem
+from app.db.reminder_stats import (add_to_summary, stats_summary_ref,
+                                   summary_increments, timestamp_ms,
+                                   title_category)
+from app.routes.tokens import verify_id_token
+from app.routes.schemas import MessageBody, ReminderBody, parse_body
+
+logger = logging.getLogger(__name__)
 
 # Create Blueprint
 chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/routes/companion')
@@ -24,15 +36,126 @@ def get_rag_system():
     return rag_system
 
 
+# Bounds on conversation history requests
+MAX_HISTORY_LIMIT = 200
+MAX_TIMESTAMP_LENGTH = 40
+
+# Daily check prompts are synthesized in the background and served from Cloud
+# Storage through signed URLs instead of being inlined as base64
+AUDIO_BUCKET = os.environ.get("GCP_AUDIO_BUCKET", "memento-audio")
+AUDIO_URL_TTL = timedelta(hours=24)
+_tts_executor = ThreadPoolExecutor(max_workers=2,
+                                   thread_name_prefix="daily-check-tts")
+
+# Cloud Storage client and its credentials, created on first use and shared
+# by the synthesis threads
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Lazy initialization of the Cloud Storage client and its credentials"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            import google.auth
+            from google.cloud import storage
+
+            credentials, project = google.auth.default(
+                scopes=["https://www.googleapis.com/auth/cloud-platform"])
+            _storage = (storage.Client(project=project,
+                                       credentials=credentials), credentials)
+        return _storage
+
+
+def _signed_audio_url(blob, credentials):
+    """
+    V4 signed URL for an audio blob. The URL is signed through the IAM
+    signBlob API with the service account's access token, so Compute Engine
+    and Cloud Run credentials, which have no private key, work too; the
+    service account needs the Service Account Token Creator role on itself.
+    """
+    from google.auth.transport.requests import Request
+
+    with _storage_lock:
+        if not credentials.valid:
+            credentials.refresh(Request())
+        service_account_email = credentials.service_account_email
+        access_token = credentials.token
+    return blob.generate_signed_url(
+        expiration=AUDIO_URL_TTL,
+        version="v4",
+        service_account_email=service_account_email,
+        access_token=access_token)
+
+
+def _synthesize_check_audio(rag, check_ref, prompt):
+    """Synthesize a daily check prompt and link the audio from the check"""
+    try:
+        client, credentials = get_storage()
+
+        audio = rag.text_to_speech(prompt)
+        blob = client.bucket(AUDIO_BUCKET).blob(
+            f"daily-checks/{check_ref.id}.mp3")
+        blob.upload_from_string(audio, content_type="audio/mpeg")
+        check_ref.update({
+            'audioPromptUrl': _signed_audio_url(blob, credentials),
+            'audioPromptStatus': 'ready'
+        })
+    except Exception:
+        logger.exception("Error synthesizing daily check audio")
+        try:
+            check_ref.update({'audioPromptStatus': 'failed'})
+        except Exception:
+            logger.exception("Error marking daily check audio as failed")
+
+
+# Recently read patient profiles. They are read on most requests and rarely
+# change, so a short-lived copy is good enough for display fields and
+# existence checks.
+_user_cache = TTLCache(maxsize=5000, ttl=30)
+_user_cache_lock = threading.Lock()
+
+# Profile fields the companion routes use; only these are fetched and cached
+# so other large fields stay on the server
+USER_PROFILE_FIELDS = ['displayName']
+
+
+def cache_user_doc(patient_id, user_doc):
+    """Store the profile fields of a user document snapshot, returning them"""
+    user_data = None
+    if user_doc.exists:
+        doc_data = user_doc.to_dict()
+        user_data = {
+            field: doc_data[field]
+            for field in USER_PROFILE_FIELDS if field in doc_data
+        }
+    with _user_cache_lock:
+        _user_cache[patient_id] = user_data
+    return user_data
+
+
+def get_user_data(patient_id):
+    """Get a patient's user document data (None if missing), cache first"""
+    with _user_cache_lock:
+        if patient_id in _user_cache:
+            return _user_cache[patient_id]
+
+    user_doc = current_app.db.collection('users').document(patient_id).get(
+        field_paths=USER_PROFILE_FIELDS)
+    return cache_user_doc(patient_id, user_doc)
+
+
 # Authentication middleware
 def token_required(f):
 
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        # Get token from header
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
+        # Get token from header ("Bearer <token>")
+        scheme, _, token = request.headers.get('Authorization',
+                                               '').partition(' ')
+        if scheme.lower() != 'bearer':
+            token = None
 
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
@@ -40,7 +163,7 @@ def token_required(f):
         try:
             # Verify token (implementation depends on your auth system)
             # This is a placeholder - replace with your actual token verification
-            user_id = current_app.auth.verify_id_token(token)['uid']
+            user_id = verify_id_token(token, 'auth')['uid']
             request.user_id = user_id
         except Exception as e:
             return jsonify({'error': f'Invalid token: {str(e)}'}), 401
@@ -60,15 +183,12 @@ def send_message():
     - patient_id: string (required) - ID of the patient
     - message: string (required) - Text message from the patient
     """
-    data = request.json
-
-    # Validate input
-    if not data or 'message' not in data or 'patient_id' not in data:
-        return jsonify(
-            {'error': 'Missing required fields: patient_id and message'}), 400
+    body, error = parse_body(MessageBody)
+    if error:
+        return jsonify({'error': error}), 400
 
-    patient_id = data.get('patient_id')
-    message = data.get('message')
+    patient_id = body.patient_id
+    message = body.message
 
     # Process message
     try:
@@ -133,17 +253,20 @@ def get_history(patient_id):
     - patient_id: string (required) - ID of the patient
     
     Query Parameters:
-    - limit: integer (optional) - Number of messages to retrieve (default: 50)
+    - limit: integer (optional) - Number of messages to retrieve (default: 50, max: 200)
     - before: string (optional) - Timestamp to retrieve messages before
     """
     # Get query parameters
     try:
-        limit = int(request.args.get('limit', 50))
+        limit = max(1, min(int(request.args.get('limit', 50)),
+                           MAX_HISTORY_LIMIT))
         before_str = request.args.get('before')
 
         # Parse 'before' timestamp if provided
         before = None
         if before_str:
+            if len(before_str) > MAX_TIMESTAMP_LENGTH:
+                raise ValueError('before is not a valid timestamp')
             before = datetime.fromisoformat(before_str)
 
     except ValueError as e:
@@ -152,32 +275,18 @@ def get_history(patient_id):
     # Retrieve conversation history
     try:
         # Get reference to the conversations collection
-        conv_ref = current_app.db.collection("conversations").document(
-            patient_id)
-        conv_doc = conv_ref.get()
+        messages_ref = current_app.db.collection("conversations").document(
+            patient_id).collection("messages")
 
-        if not conv_doc.exists:
-            return jsonify({'messages': []}), 200
-
-        messages = conv_doc.to_dict().get('messages', [])
-
-        # Filter by timestamp if 'before' is provided
+        # Let Firestore filter, sort (newest first) and limit the messages
+        query = messages_ref
         if before:
-            messages = [
-                msg for msg in messages
-                if 'timestamp' in msg and msg['timestamp'] < before
-            ]
-
-        # Sort by timestamp (newest first) and limit
-        messages.sort(key=lambda x: x.get('timestamp', datetime.min),
-                      reverse=True)
-        messages = messages[:limit]
-
-        # Convert datetime objects to ISO strings for JSON serialization
-        for msg in messages:
-            if 'timestamp' in msg and isinstance(msg['timestamp'], datetime):
-                msg['timestamp'] = msg['timestamp'].isoformat()
+            query = query.where("timestamp", "<", before)
+        query = query.order_by(
+            "timestamp", direction=firestore.Query.DESCENDING).limit(limit)
+        messages = [doc.to_dict() for doc in query.stream()]
 
+        # Timestamps are written as ISO strings by the app's JSON provider
         return jsonify({'messages': messages}), 200
 
     except Exception as e:
@@ -203,23 +312,33 @@ def daily_check(patient_id):
                                        minute=0,
                                        second=0,
                                        microsecond=0)
-        tomorrow = today + timedelta(days=1)
 
-        # Get daily checks collection
+        # Get daily checks collection; each patient has at most one check per
+        # day, stored under a deterministic id so it can be fetched directly
         daily_checks_ref = current_app.db.collection("dailyChecks")
+        check_ref = daily_checks_ref.document(
+            f"{patient_id}_{today.strftime('%Y-%m-%d')}")
+
+        # Get today's check, fetching the patient profile in the same request
+        # when it isn't cached (it is needed if the check has to be created)
+        with _user_cache_lock:
+            patient_cached = patient_id in _user_cache
+        if patient_cached:
+            check_doc = check_ref.get()
+        else:
+            patient_ref = current_app.db.collection("users").document(
+                patient_id)
+            docs = {
+                doc.reference.path: doc
+                for doc in current_app.db.get_all([check_ref, patient_ref])
+            }
+            check_doc = docs[check_ref.path]
+            cache_user_doc(patient_id, docs[patient_ref.path])
 
-        # Query for today's check
-        query = daily_checks_ref.where("patientId", "==", patient_id) \
-                               .where("timestamp", ">=", today) \
-                               .where("timestamp", "<", tomorrow) \
-                               .limit(1)
-
-        checks = list(query.stream())
-
-        if checks:
+        if check_doc.exists:
             # Today's check exists
-            check_data = checks[0].to_dict()
-            check_data['id'] = checks[0].id
+            check_data = check_doc.to_dict()
+            check_data['id'] = check_doc.id
 
             if check_data.get('completed', False):
                 # Check is already completed
@@ -243,34 +362,30 @@ def daily_check(patient_id):
         rag = get_rag_system()
 
         # Get patient info for personalization
-        patient_doc = current_app.db.collection("users").document(
-            patient_id).get()
-        if not patient_doc.exists:
+        patient_data = get_user_data(patient_id)
+        if patient_data is None:
             return jsonify({'error': 'Patient not found'}), 404
 
-        patient_data = patient_doc.to_dict()
         first_name = patient_data.get("displayName", "").split()[0]
 
         # Create personalized prompt
         initial_prompt = f"Good morning {first_name}! How are you feeling today? This is our daily check-in."
 
-        # Generate audio for the prompt
-        audio_response = rag.text_to_speech(initial_prompt)
-        audio_base64 = base64.b64encode(audio_response).decode('utf-8')
-
-        # Create new daily check
+        # Create new daily check; the spoken prompt is generated in the
+        # background and its URL added to the check once ready
         new_check = {
             'patientId': patient_id,
             'timestamp': firestore.SERVER_TIMESTAMP,
             'completed': False,
             'initialPrompt': initial_prompt,
-            'audioPrompt': audio_base64,
+            'audioPromptStatus': 'pending',
             'responses': []
         }
 
         # Save to Firestore
-        check_ref = daily_checks_ref.document()
         check_ref.set(new_check)
+        _tts_executor.submit(_synthesize_check_audio, rag, check_ref,
+                             initial_prompt)
 
         # Return the new check
         new_check['id'] = check_ref.id
@@ -278,7 +393,7 @@ def daily_check(patient_id):
             'dailyCheck': new_check,
             'completed': False,
             'initialPrompt': initial_prompt,
-            'audioPrompt': audio_base64
+            'audioPromptStatus': 'pending'
         }), 200
 
     except Exception as e:
@@ -298,54 +413,52 @@ def create_reminder():
     - title: string (required) - Reminder title
     - description: string (required) - Reminder description
     - timestamp: string (required) - When the reminder should trigger (ISO format)
+    - category: string (optional) - Reminder category (default: first word of the title)
     - message_id: string (optional) - ID of the message that triggered this reminder
     """
-    data = request.json
-
-    # Validate input
-    required_fields = ['patient_id', 'title', 'description', 'timestamp']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    body, error = parse_body(ReminderBody)
+    if error:
+        return jsonify({'error': error}), 400
 
     try:
-        patient_id = data['patient_id']
+        patient_id = body.patient_id
 
         # Parse timestamp
-        reminder_time = datetime.fromisoformat(data['timestamp'])
+        reminder_time = datetime.fromisoformat(body.timestamp)
 
         # Create reminder object
         reminder = {
             'id': str(uuid.uuid4()),
-            'title': data['title'],
-            'description': data['description'],
+            'title': body.title,
+            'category': title_category(body.title, body.category),
+            'description': body.description,
             'timestamp': reminder_time,
+            'timestampMs': timestamp_ms(reminder_time),
             'isCompleted': False,
-            'createdAt': firestore.SERVER_TIMESTAMP
+            'createdAt': datetime.now()
         }
 
         # Add message_id if provided
-        if 'message_id' in data:
-            reminder['messageId'] = data['message_id']
+        if body.message_id is not None:
+            reminder['messageId'] = body.message_id
 
         # Add imageUrl if provided
-        if 'image_url' in data:
-            reminder['imageUrl'] = data['image_url']
-
-        # Get user document
-        user_ref = current_app.db.collection('users').document(patient_id)
-        user_doc = user_ref.get()
+        if body.image_url is not None:
+            reminder['imageUrl'] = body.image_url
 
-        if not user_doc.exists:
+        if get_user_data(patient_id) is None:
             return jsonify({'error': 'Patient not found'}), 404
 
-        # Add reminder to user's reminders array
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        reminders.append(reminder)
-
-        # Update user document
-        user_ref.update({'reminders': reminders})
+        # Store the reminder in the patient's reminders subcollection along
+        # with its stats summary counters
+        batch = current_app.db.batch()
+        batch.set(
+            current_app.db.collection('users').document(patient_id).collection(
+                'reminders').document(reminder['id']), reminder)
+        batch.set(stats_summary_ref(current_app.db, patient_id),
+                  summary_increments(add_to_summary({}, reminder)),
+                  merge=True)
+        batch.commit()
 
         return jsonify({'reminder_id': reminder['id'], 'success': True}), 200
 
@@ -401,11 +514,50 @@ def get_insights(patient_id):
                                        microsecond=0)
 
         # Get conversation messages
-        conv_ref = current_app.db.collection("conversations").document(
-            patient_id)
-        conv_doc = conv_ref.get()
-
-        if not conv_doc.exists:
+        messages_ref = current_app.db.collection("conversations").document(
+            patient_id).collection("messages")
+        period_query = messages_ref.where("timestamp", ">=", start_date)
+
+        # Calculate insights in a single pass, decoding each message as it
+        # is streamed rather than collecting the period's messages first
+        message_count = 0
+        topics_count = Counter()
+        sentiment_data = []
+        memory_count = 0
+        helpful_memories = 0
+        conversation_days = Counter()
+        for doc in period_query.stream():
+            msg = doc.to_dict()
+            message_count += 1
+            timestamp = msg.get('timestamp')
+
+            if msg.get('sender') == 'patient':
+                # 1. Top Topics
+                topics_count.update(msg.get('topics', []))
+
+                # 2. Sentiment Trend
+                if 'sentiment' in msg:
+                    sentiment_data.append({
+                        'timestamp':
+                        timestamp.isoformat()
+                        if isinstance(timestamp, datetime) else timestamp,
+                        'sentiment':
+                        msg.get('sentiment'),
+                        'score':
+                        msg.get('sentimentScore', 0)
+                    })
+
+            # 3. Memory Usage
+            if 'memories' in msg:
+                memory_count += 1
+            if msg.get('memoriesHelpful', False):
+                helpful_memories += 1
+
+            # 4. Conversation Frequency
+            if isinstance(timestamp, datetime):
+                conversation_days[timestamp.strftime('%Y-%m-%d')] += 1
+
+        if message_count == 0:
             return jsonify({
                 'topTopics': [],
                 'sentimentTrend': [],
@@ -419,62 +571,13 @@ def get_insights(patient_id):
                 }
             }), 200
 
-        all_messages = conv_doc.to_dict().get('messages', [])
-
-        # Filter messages by date
-        period_messages = [
-            msg for msg in all_messages
-            if 'timestamp' in msg and msg['timestamp'] >= start_date
-        ]
-
-        # Calculate insights
-
-        # 1. Top Topics
-        topics_count = {}
-        for msg in period_messages:
-            if msg.get('sender') == 'patient' and 'topics' in msg:
-                for topic in msg.get('topics', []):
-                    topics_count[topic] = topics_count.get(topic, 0) + 1
-
-        # Sort topics by count
-        top_topics = sorted([{
+        top_topics = [{
             'topic': topic,
             'count': count
-        } for topic, count in topics_count.items()],
-                            key=lambda x: x['count'],
-                            reverse=True)[:5]  # Get top 5
-
-        # 2. Sentiment Trend
-        sentiment_data = []
-        for msg in period_messages:
-            if msg.get('sender') == 'patient' and 'sentiment' in msg:
-                sentiment_data.append({
-                    'timestamp':
-                    msg.get('timestamp').isoformat() if isinstance(
-                        msg.get('timestamp'), datetime) else
-                    msg.get('timestamp'),
-                    'sentiment':
-                    msg.get('sentiment'),
-                    'score':
-                    msg.get('sentimentScore', 0)
-                })
-
-        # 3. Memory Usage
-        memory_count = sum(1 for msg in period_messages if 'memories' in msg)
-        helpful_memories = sum(1 for msg in period_messages
-                               if msg.get('memoriesHelpful', False))
-
-        # 4. Conversation Frequency
-        conversation_days = {}
-        for msg in period_messages:
-            if 'timestamp' in msg and isinstance(msg.get('timestamp'),
-                                                 datetime):
-                day_key = msg.get('timestamp').strftime('%Y-%m-%d')
-                conversation_days[day_key] = conversation_days.get(day_key,
-                                                                   0) + 1
+        } for topic, count in topics_count.most_common(5)]
 
         total_days = (today - start_date).days + 1
-        daily_average = len(period_messages) / max(total_days, 1)
+        daily_average = message_count / max(total_days, 1)
 
         # Compile insights
         insights = {
@@ -489,7 +592,7 @@ def get_insights(patient_id):
                                       100) if memory_count > 0 else 0
             },
             'conversationFrequency': {
-                'total': len(period_messages),
+                'total': message_count,
                 'perDay': daily_average,
                 'activeDays': len(conversation_days),
                 'totalDays': total_days
@@ -1,22 +1,33 @@
 from flask import Blueprint, request, jsonify, current_app
 from functools import wraps
-from datetime import datetime, timedelta
+import json
+import threading
 
 # Import the MementoQuizSystem
 from app.quiz_system import MementoQuizSystem
+from app.routes.tokens import verify_id_token
+from app.routes.schemas import GenerateQuizBody, QuizAnswerBody, parse_body
 
 # Create Blueprint
 quiz_bp = Blueprint('quizzes', __name__, url_prefix='/routes/quizzes')
 
-# Initialize Quiz system
-quiz_system = None
+# Guards the one-time creation of the app's Quiz system
+_quiz_system_lock = threading.Lock()
+
+# Longest statistics window a client can request, in days
+MAX_STATS_DAYS = 365
 
 
 def get_quiz_system():
-    """Lazy initialization of the Quiz system"""
-    global quiz_system
+    """Lazy initialization of the Quiz system, shared by the app's threads"""
+    quiz_system = current_app.extensions.get('quiz_system')
     if quiz_system is None:
-        quiz_system = MementoQuizSystem(db=current_app.config['FIREBASE_DB'])
+        with _quiz_system_lock:
+            quiz_system = current_app.extensions.get('quiz_system')
+            if quiz_system is None:
+                quiz_system = MementoQuizSystem(
+                    db=current_app.config['FIREBASE_DB'])
+                current_app.extensions['quiz_system'] = quiz_system
     return quiz_system
 
 
@@ -25,18 +36,17 @@ def token_required(f):
 
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        # Get token from header
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
-
-        if not token:
+        # Get token from header ("Bearer <token>"), rejecting anything else
+        # before any parsing or token verification
+        auth_header = request.headers.get('Authorization', '')
+        token = auth_header[7:]
+        if not token or auth_header[:7].lower() != 'bearer ':
             return jsonify({'error': 'Token is missing'}), 401
 
         try:
             # Verify token (implementation depends on your auth system)
             # This is a placeholder - replace with your actual token verification
-            user_id = current_app.jwt.verify_id_token(token)['uid']
+            user_id = verify_id_token(token, 'jwt')['uid']
             request.user_id = user_id
         except Exception as e:
             return jsonify({'error': f'Invalid token: {str(e)}'}), 401
@@ -57,33 +67,13 @@ def generate_quiz():
     - quiz_type: string (optional) - Type of quiz ('memory', 'conversation', 'mixed', 'general')
     - question_count: int (optional) - Number of questions to generate (default: 5)
     """
-    data = request.json
-
-    # Validate input
-    if not data or 'patient_id' not in data:
-        return jsonify({'error': 'Missing required field: patient_id'}), 400
-
-    # Get parameters
-    patient_id = data.get('patient_id')
-    quiz_type = data.get('quiz_type', 'mixed')
-    question_count = data.get('question_count', 5)
-
-    # Validate quiz_type
-    valid_types = ['memory', 'conversation', 'mixed', 'general']
-    if quiz_type not in valid_types:
-        return jsonify({
-            'error':
-            f'Invalid quiz_type. Must be one of: {", ".join(valid_types)}'
-        }), 400
-
-    # Validate question_count
-    try:
-        question_count = int(question_count)
-        if question_count < 1 or question_count > 10:
-            return jsonify(
-                {'error': 'question_count must be between 1 and 10'}), 400
-    except ValueError:
-        return jsonify({'error': 'question_count must be an integer'}), 400
+    body, error = parse_body(GenerateQuizBody)
+    if error:
+        return jsonify({'error': error}), 400
+
+    patient_id = body.patient_id
+    quiz_type = body.quiz_type
+    question_count = body.question_count
 
     # Generate quiz
     try:
@@ -113,26 +103,13 @@ def submit_answer():
     - question_id: string (required) - ID of the question being answered
     - selected_option: string (required) - The option selected by the patient (A, B, C, or D)
     """
-    data = request.json
-
-    # Validate input
-    required_fields = ['quiz_id', 'question_id', 'selected_option']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-
-    # Get parameters
-    quiz_id = data.get('quiz_id')
-    question_id = data.get('question_id')
-    selected_option = data.get('selected_option')
-
-    # Validate selected_option
-    valid_options = ['A', 'B', 'C', 'D']
-    if selected_option not in valid_options:
-        return jsonify({
-            'error':
-            f'Invalid selected_option. Must be one of: {", ".join(valid_options)}'
-        }), 400
+    body, error = parse_body(QuizAnswerBody)
+    if error:
+        return jsonify({'error': error}), 400
+
+    quiz_id = body.quiz_id
+    question_id = body.question_id
+    selected_option = body.selected_option
 
     # Record answer
     try:
@@ -215,34 +192,42 @@ def get_quiz_history():
                         f'Failed to retrieve quiz history: {str(e)}'}), 500
 
 
+# Quiz categories never change, so the response body is serialized once
+_QUIZ_CATEGORIES = [{
+    "id": "memory",
+    "name": "Memory Quiz",
+    "description": "Questions based on patient's personal memories",
+    "icon": "brain"
+}, {
+    "id": "conversation",
+    "name": "Conversation Quiz",
+    "description": "Questions based on recent conversations",
+    "icon": "message-circle"
+}, {
+    "id": "mixed",
+    "name": "Mixed Quiz",
+    "description": "Combination of memory and conversation questions",
+    "icon": "layers"
+}, {
+    "id": "general",
+    "name": "General Knowledge",
+    "description": "Simple general knowledge questions",
+    "icon": "book-open"
+}]
+
+_CATEGORIES_RESPONSE = (json.dumps({"categories": _QUIZ_CATEGORIES},
+                                   separators=(",", ":")), 200, {
+                                       "Content-Type": "application/json",
+                                       "Cache-Control": "public, max-age=86400"
+                                   })
+
+
 @quiz_bp.route('/categories', methods=['GET'])
 def get_quiz_categories():
     """
     Get available quiz categories
     """
-    categories = [{
-        "id": "memory",
-        "name": "Memory Quiz",
-        "description": "Questions based on patient's personal memories",
-        "icon": "brain"
-    }, {
-        "id": "conversation",
-        "name": "Conversation Quiz",
-        "description": "Questions based on recent conversations",
-        "icon": "message-circle"
-    }, {
-        "id": "mixed",
-        "name": "Mixed Quiz",
-        "description": "Combination of memory and conversation questions",
-        "icon": "layers"
-    }, {
-        "id": "general",
-        "name": "General Knowledge",
-        "description": "Simple general knowledge questions",
-        "icon": "book-open"
-    }]
-
-    return jsonify({"categories": categories}), 200
+    return _CATEGORIES_RESPONSE
 
 
 @quiz_bp.route('/stats', methods=['GET'])
@@ -253,105 +238,27 @@ def get_quiz_stats():
     
     Query Parameters:
     - patient_id: string (required) - ID of the patient
-    - days: int (optional) - Number of days to include in statistics (default: 30)
+    - days: int (optional) - Number of days to include in statistics (default: 30, max: 365)
     """
     # Get query parameters
     patient_id = request.args.get('patient_id')
-    days = request.args.get('days', 30, type=int)
+    days = max(1, min(request.args.get('days', 30, type=int), MAX_STATS_DAYS))
 
     # Validate patient_id
     if not patient_id:
         return jsonify({'error':
                         'Missing required parameter: patient_id'}), 400
 
+    # Get stats
     try:
-        # Get Firestore connection
-        db = current_app.config['FIREBASE_DB']
-
-        # Calculate time window
-        now = datetime.now()
-        start_date = now - timedelta(days=days)
-
-        # Query for completed quizzes in the time window
-        quiz_query = db.collection("quizSessions") \
-            .where("patientId", "==", patient_id) \
-            .where("status", "==", "completed") \
-            .where("completedAt", ">=", start_date) \
-            .stream()
-
-        # Process the quiz data
-        quizzes = []
-        for doc in quiz_query:
-            quiz_data = doc.to_dict()
-            quiz_info = {
-                "id": quiz_data.get("id"),
-                "quizType": quiz_data.get("quizType", "unknown"),
-                "score": quiz_data.get("score", 0),
-                "completedAt": quiz_data.get("completedAt")
-            }
-
-            # Convert datetime to string if needed
-            if isinstance(quiz_info["completedAt"], datetime):
-                quiz_info["completedAt"] = quiz_info["completedAt"].isoformat()
-
-            quizzes.append(quiz_info)
-
-        # Calculate statistics
-        total_quizzes = len(quizzes)
-        if total_quizzes == 0:
-            return jsonify({
-                "totalQuizzes": 0,
-                "averageScore": 0,
-                "quizzesByType": {},
-                "scoresByType": {},
-                "recentScores": [],
-                "scoreTrend": []
-            }), 200
-
-        # Sort quizzes by date
-        quizzes.sort(key=lambda q: q["completedAt"])
-
-        # Average score
-        avg_score = sum(q["score"] for q in quizzes) / total_quizzes
-
-        # Quizzes by type
-        quizzes_by_type = {}
-        scores_by_type = {}
-
-        for quiz in quizzes:
-            quiz_type = quiz["quizType"]
-            if quiz_type not in quizzes_by_type:
-                quizzes_by_type[quiz_type] = 0
-                scores_by_type[quiz_type] = []
-
-            quizzes_by_type[quiz_type] += 1
-            scores_by_type[quiz_type].append(quiz["score"])
-
-        # Calculate average score by type
-        avg_scores_by_type = {}
-        for quiz_type, scores in scores_by_type.items():
-            avg_scores_by_type[quiz_type] = sum(scores) / len(scores)
-
-        # Recent scores (last 10)
-        recent_scores = [q["score"] for q in quizzes[-10:]]
-
-        # Score trend data (for charts)
-        score_trend = []
-        for quiz in quizzes:
-            score_trend.append({
-                "date": quiz["completedAt"],
-                "score": quiz["score"],
-                "type": quiz["quizType"]
-            })
-
-        return jsonify({
-            "totalQuizzes": total_quizzes,
-            "averageScore": round(avg_score, 1),
-            "quizzesByType": quizzes_by_type,
-            "scoresByType": avg_scores_by_type,
-            "recentScores": recent_scores,
-            "scoreTrend": score_trend
-        }), 200
+        quiz_system = get_quiz_system()
+        result = quiz_system.get_patient_quiz_stats(patient_id=patient_id,
+                                                    days=days)
+
+        if 'error' in result:
+            return jsonify({'error': result['error']}), 500
+
+        return jsonify(result), 200
 
     except Exception as e:
         current_app.logger.error(f"Error retrieving quiz statistics: {str(e)}")
@@ -1,20 +1,115 @@
 from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import threading
 import uuid
+from cachetools import TTLCache
 from firebase_admin import firestore
 from functools import wraps
+from google.api_core import exceptions as api_exceptions
+from werkzeug.exceptions import HTTPException
+
+from app.db.reminder_stats import (add_to_summary, compute_stats,
+                                   stats_summary_ref, summary_increments,
+                                   timestamp_ms, title_category)
+from app.routes.tokens import verify_id_token
+from app.routes.schemas import (BulkReminderBody, PatientBody, ReminderBody,
+                                ReminderUpdateBody, parse_body)
 
 # Create Blueprint
 reminder_bp = Blueprint('reminders', __name__, url_prefix='/routes/reminders')
 
+# Largest page of reminders the list route returns in one response
+MAX_REMINDER_PAGE = 500
+
+# Longest look-ahead of /upcoming and longest period analyzed by /stats
+MAX_UPCOMING_HOURS = 24 * 365
+MAX_STATS_DAYS = 365
+
+# Patients known to exist. Clients poll the list, /upcoming and /stats on a
+# timer, and an empty result needs an existence check to tell a patient with
+# no reminders from an unknown one; misses are not cached, so a patient who
+# just signed up is found right away.
+_patient_cache = TTLCache(maxsize=5000, ttl=30)
+_patient_cache_lock = threading.Lock()
+
+
+def reminders_collection(patient_id):
+    """Get the reminders subcollection of a patient (users/{id}/reminders)"""
+    return current_app.config['FIREBASE_DB'].collection('users').document(
+        patient_id).collection('reminders')
+
+
+def patient_exists(patient_id):
+    """Check that a patient's user document exists without reading its fields"""
+    with _patient_cache_lock:
+        if patient_id in _patient_cache:
+            return True
+    exists = current_app.config['FIREBASE_DB'].collection('users').document(
+        patient_id).get(field_paths=[]).exists
+    if exists:
+        with _patient_cache_lock:
+            _patient_cache[patient_id] = True
+    return exists
+
+
+@firestore.transactional
+def _change_reminders_in_transaction(transaction, refs, summary_ref, updates):
+    """Apply change_reminders to the given reminders in a transaction"""
+    snapshots = list(transaction.get_all(refs))
+    if len(snapshots) < len(refs) or not all(doc.exists for doc in snapshots):
+        return None
+    
+    deltas = {}
+    results = []
+    for snapshot in snapshots:
+        reminder = snapshot.to_dict()
+        add_to_summary(deltas, reminder, -1)
+        if updates is None:
+            transaction.delete(snapshot.reference)
+        else:
+            reminder.update(updates)
+            add_to_summary(deltas, reminder, 1)
+            transaction.update(snapshot.reference, updates)
+        results.append(reminder)
+    
+    increments = summary_increments(deltas)
+    if increments:
+        transaction.set(summary_ref, increments, merge=True)
+    return results
+
+
+def change_reminders(patient_id, reminder_ids, updates):
+    """
+    Update reminders with the given fields, or delete them when updates is
+    None, adjusting the patient's stats summary counters in the same
+    transaction (bulk bodies are capped at REMINDER_WRITE_CHUNK ids to fit)
+    
+    Returns:
+        List of the resulting reminders, or None if a reminder doesn't exist,
+        in which case none are changed
+    """
+    db = current_app.config['FIREBASE_DB']
+    coll = reminders_collection(patient_id)
+    refs = [coll.document(rid) for rid in reminder_ids]
+    return _change_reminders_in_transaction(
+        db.transaction(), refs, stats_summary_ref(db, patient_id), updates)
+
+
+def reminder_not_found(patient_id):
+    """404 response for a missing reminder, telling apart a missing patient"""
+    if not patient_exists(patient_id):
+        return jsonify({'error': 'Patient not found'}), 404
+    return jsonify({'error': 'Reminder not found'}), 404
+
+
 # Authentication middleware
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        # Get token from header
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
+        # Get token from header ("Bearer <token>")
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer':
+            token = None
         
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
@@ -22,7 +117,7 @@ def token_required(f):
         try:
             # Verify token (implementation depends on your auth system)
             # This is a placeholder - replace with your actual token verification
-            user_id = current_app.jwt.verify_id_token(token)['uid']
+            user_id = verify_id_token(token, 'jwt')['uid']
             request.user_id = user_id
         except Exception as e:
             return jsonify({'error': f'Invalid token: {str(e)}'}), 401
@@ -31,6 +126,27 @@ def token_required(f):
     
     return decorated
 
+# Errors raised by the routes below are turned into JSON responses here, so
+# the route bodies don't each need a try/except
+@reminder_bp.errorhandler(api_exceptions.NotFound)
+def handle_firestore_not_found(e):
+    return jsonify({'error': f'Not found: {e.message}'}), 404
+
+
+@reminder_bp.errorhandler(api_exceptions.InvalidArgument)
+def handle_firestore_invalid_argument(e):
+    return jsonify({'error': f'Invalid request: {e.message}'}), 400
+
+
+@reminder_bp.errorhandler(Exception)
+def handle_reminder_error(e):
+    # Aborts and other HTTP errors keep their own status and response
+    if isinstance(e, HTTPException):
+        return e
+    current_app.logger.error(f"Error in {request.endpoint}: {str(e)}")
+    return jsonify({'error': f'Failed to process reminder request: {str(e)}'}), 500
+
+
 @reminder_bp.route('/', methods=['GET'])
 @token_required
 def get_reminders():
@@ -42,83 +158,75 @@ def get_reminders():
     - status: string (optional) - Filter by status ('all', 'active', 'completed')
     - from_date: string (optional) - Start date for filtering (ISO format)
     - to_date: string (optional) - End date for filtering (ISO format)
+    - limit: integer (optional) - Page size (max: 500); all reminders when omitted
+    - after: string (optional) - ID of the last reminder of the previous page
     """
     # Get query parameters
     patient_id = request.args.get('patient_id')
     status = request.args.get('status', 'all')
     from_date_str = request.args.get('from_date')
     to_date_str = request.args.get('to_date')
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
     
     # Validate patient_id
     if not patient_id:
         return jsonify({'error': 'Missing required parameter: patient_id'}), 400
     
-    try:
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Get reminders from user document
-        user_data = user_doc.to_dict()
-        all_reminders = user_data.get('reminders', [])
-        
-        # Parse dates if provided
-        from_date = None
-        to_date = None
-        if from_date_str:
-            try:
-                from_date = datetime.fromisoformat(from_date_str)
-            except ValueError:
-                return jsonify({'error': 'Invalid from_date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
-                
-        if to_date_str:
-            try:
-                to_date = datetime.fromisoformat(to_date_str)
-            except ValueError:
-                return jsonify({'error': 'Invalid to_date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
-        
-        # Filter reminders
-        filtered_reminders = []
-        for reminder in all_reminders:
-            # Skip if timestamp is missing
-            if 'timestamp' not in reminder:
-                continue
-                
-            reminder_time = reminder['timestamp']
-            
-            # Status filter
-            if status != 'all':
-                is_completed = reminder.get('isCompleted', False)
-                if (status == 'completed' and not is_completed) or (status == 'active' and is_completed):
-                    continue
+    if limit is not None:
+        limit = max(1, min(limit, MAX_REMINDER_PAGE))
+    
+    # Parse dates if provided
+    from_date = None
+    to_date = None
+    if from_date_str:
+        try:
+            from_date = datetime.fromisoformat(from_date_str)
+        except ValueError:
+            return jsonify({'error': 'Invalid from_date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
             
-            # Date range filter
-            if from_date and reminder_time < from_date:
-                continue
-                
-            if to_date and reminder_time > to_date:
-                continue
-                
-            filtered_reminders.append(reminder)
-        
-        # Convert datetime objects to ISO strings for JSON serialization
-        for reminder in filtered_reminders:
-            if 'timestamp' in reminder and isinstance(reminder['timestamp'], datetime):
-                reminder['timestamp'] = reminder['timestamp'].isoformat()
-            if 'createdAt' in reminder and isinstance(reminder['createdAt'], datetime):
-                reminder['createdAt'] = reminder['createdAt'].isoformat()
-        
-        return jsonify({
-            'reminders': filtered_reminders,
-            'total': len(filtered_reminders)
-        }), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving reminders: {str(e)}")
-        return jsonify({'error': f'Failed to retrieve reminders: {str(e)}'}), 500
+    if to_date_str:
+        try:
+            to_date = datetime.fromisoformat(to_date_str)
+        except ValueError:
+            return jsonify({'error': 'Invalid to_date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
+    
+    # Filter reminders in Firestore; ordering by timestamp also leaves
+    # out reminders without one
+    query = reminders_collection(patient_id)
+    if status == 'completed':
+        query = query.where('isCompleted', '==', True)
+    elif status == 'active':
+        query = query.where('isCompleted', '==', False)
+    if from_date:
+        query = query.where('timestampMs', '>=', timestamp_ms(from_date))
+    if to_date:
+        query = query.where('timestampMs', '<=', timestamp_ms(to_date))
+    query = query.order_by('timestampMs')
+    
+    # Pages continue from the previous page's last reminder with a
+    # cursor, so Firestore doesn't rescan the earlier pages
+    if after:
+        after_doc = reminders_collection(patient_id).document(after).get()
+        if not after_doc.exists:
+            return jsonify({'error': 'Invalid after: reminder not found'}), 400
+        query = query.start_after(after_doc)
+    if limit is not None:
+        query = query.limit(limit)
+    
+    filtered_reminders = [doc.to_dict() for doc in query.stream()]
+    
+    # An empty result may mean the patient doesn't exist
+    if not filtered_reminders and not patient_exists(patient_id):
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    response = {
+        'reminders': filtered_reminders,
+        'total': len(filtered_reminders)
+    }
+    if limit is not None and len(filtered_reminders) == limit:
+        response['next_after'] = filtered_reminders[-1]['id']
+    return jsonify(response), 200
 
 @reminder_bp.route('/', methods=['POST'])
 @token_required
@@ -131,66 +239,53 @@ def create_reminder():
     - title: string (required) - Reminder title
     - description: string (required) - Reminder description
     - timestamp: string (required) - When the reminder should trigger (ISO format)
+    - category: string (optional) - Reminder category (default: first word of the title)
     - image_url: string (optional) - URL to an image for the reminder
     """
-    data = request.json
+    body, error = parse_body(ReminderBody)
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Validate input
-    required_fields = ['patient_id', 'title', 'description', 'timestamp']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    patient_id = body.patient_id
     
+    # Parse timestamp
     try:
-        patient_id = data['patient_id']
-        
-        # Parse timestamp
-        try:
-            reminder_time = datetime.fromisoformat(data['timestamp'])
-        except ValueError:
-            return jsonify({'error': 'Invalid timestamp format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
-        
-        # Create reminder object
-        reminder = {
-            'id': str(uuid.uuid4()),
-            'title': data['title'],
-            'description': data['description'],
-            'timestamp': reminder_time,
-            'isCompleted': False,
-            'createdAt': firestore.SERVER_TIMESTAMP
-        }
-        
-        # Add optional fields
-        if 'image_url' in data:
-            reminder['imageUrl'] = data['image_url']
-        
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Add reminder to user's reminders array
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        reminders.append(reminder)
-        
-        # Update user document
-        user_ref.update({'reminders': reminders})
-        
-        # Return the created reminder (convert timestamps to strings)
-        reminder_response = reminder.copy()
-        reminder_response['timestamp'] = reminder_time.isoformat()
-        
-        return jsonify({
-            'reminder': reminder_response,
-            'message': 'Reminder created successfully'
-        }), 201
-        
-    except Exception as e:
-        current_app.logger.error(f"Error creating reminder: {str(e)}")
-        return jsonify({'error': f'Failed to create reminder: {str(e)}'}), 500
+        reminder_time = datetime.fromisoformat(body.timestamp)
+    except ValueError:
+        return jsonify({'error': 'Invalid timestamp format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
+    
+    # Create reminder object
+    reminder = {
+        'id': str(uuid.uuid4()),
+        'title': body.title,
+        'category': title_category(body.title, body.category),
+        'description': body.description,
+        'timestamp': reminder_time,
+        'timestampMs': timestamp_ms(reminder_time),
+        'isCompleted': False,
+        'createdAt': datetime.now()
+    }
+    
+    # Add optional fields
+    if body.image_url is not None:
+        reminder['imageUrl'] = body.image_url
+    
+    if not patient_exists(patient_id):
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    # Each reminder is its own document; it is written together with
+    # its stats summary counters
+    db = current_app.config['FIREBASE_DB']
+    batch = db.batch()
+    batch.set(reminders_collection(patient_id).document(reminder['id']), reminder)
+    batch.set(stats_summary_ref(db, patient_id),
+              summary_increments(add_to_summary({}, reminder)), merge=True)
+    batch.commit()
+    
+    return jsonify({
+        'reminder': reminder,
+        'message': 'Reminder created successfully'
+    }), 201
 
 @reminder_bp.route('/<reminder_id>', methods=['GET'])
 @token_required
@@ -209,35 +304,13 @@ def get_reminder(reminder_id):
     if not patient_id:
         return jsonify({'error': 'Missing required parameter: patient_id'}), 400
     
-    try:
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Find the specific reminder
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        
-        reminder = next((r for r in reminders if r.get('id') == reminder_id), None)
-        
-        if not reminder:
-            return jsonify({'error': 'Reminder not found'}), 404
-        
-        # Convert datetime objects to ISO strings for JSON serialization
-        reminder_response = reminder.copy()
-        if 'timestamp' in reminder_response and isinstance(reminder_response['timestamp'], datetime):
-            reminder_response['timestamp'] = reminder_response['timestamp'].isoformat()
-        if 'createdAt' in reminder_response and isinstance(reminder_response['createdAt'], datetime):
-            reminder_response['createdAt'] = reminder_response['createdAt'].isoformat()
-        
-        return jsonify({'reminder': reminder_response}), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving reminder: {str(e)}")
-        return jsonify({'error': f'Failed to retrieve reminder: {str(e)}'}), 500
+    # Get the reminder document
+    reminder_doc = reminders_collection(patient_id).document(reminder_id).get()
+    
+    if not reminder_doc.exists:
+        return reminder_not_found(patient_id)
+    
+    return jsonify({'reminder': reminder_doc.to_dict()}), 200
 
 @reminder_bp.route('/<reminder_id>', methods=['PUT'])
 @token_required
@@ -251,78 +324,59 @@ def update_reminder(reminder_id):
     Request body:
     - patient_id: string (required) - ID of the patient
     - title: string (optional) - Updated reminder title
+    - category: string (optional) - Updated category (default: first word of a new title)
     - description: string (optional) - Updated reminder description
     - timestamp: string (optional) - Updated timestamp (ISO format)
     - is_completed: boolean (optional) - Updated completion status
     - image_url: string (optional) - Updated image URL
     """
-    data = request.json
+    body, error = parse_body(ReminderUpdateBody)
+    if error:
+        return jsonify({'error': error}), 400
     
-    if 'patient_id' not in data:
-        return jsonify({'error': 'Missing required field: patient_id'}), 400
+    patient_id = body.patient_id
+    # Only the fields present in the request body are changed
+    given = body.model_fields_set
     
-    patient_id = data['patient_id']
+    # Parse timestamp if provided
+    reminder_time = None
+    if body.timestamp is not None:
+        try:
+            reminder_time = datetime.fromisoformat(body.timestamp)
+        except ValueError:
+            return jsonify({'error': 'Invalid timestamp format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
     
-    try:
-        # Parse timestamp if provided
-        reminder_time = None
-        if 'timestamp' in data:
-            try:
-                reminder_time = datetime.fromisoformat(data['timestamp'])
-            except ValueError:
-                return jsonify({'error': 'Invalid timestamp format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
-        
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Find and update the specific reminder
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        
-        reminder_index = next((i for i, r in enumerate(reminders) if r.get('id') == reminder_id), None)
-        
-        if reminder_index is None:
-            return jsonify({'error': 'Reminder not found'}), 404
-        
-        # Update reminder fields
-        reminder = reminders[reminder_index]
-        
-        if 'title' in data:
-            reminder['title'] = data['title']
-        if 'description' in data:
-            reminder['description'] = data['description']
-        if reminder_time:
-            reminder['timestamp'] = reminder_time
-        if 'is_completed' in data:
-            reminder['isCompleted'] = bool(data['is_completed'])
-        if 'image_url' in data:
-            reminder['imageUrl'] = data['image_url']
-        
-        # Update the reminder in the list
-        reminders[reminder_index] = reminder
-        
-        # Update user document
-        user_ref.update({'reminders': reminders})
-        
-        # Prepare response
-        reminder_response = reminder.copy()
-        if 'timestamp' in reminder_response and isinstance(reminder_response['timestamp'], datetime):
-            reminder_response['timestamp'] = reminder_response['timestamp'].isoformat()
-        if 'createdAt' in reminder_response and isinstance(reminder_response['createdAt'], datetime):
-            reminder_response['createdAt'] = reminder_response['createdAt'].isoformat()
-        
-        return jsonify({
-            'reminder': reminder_response,
-            'message': 'Reminder updated successfully'
-        }), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Error updating reminder: {str(e)}")
-        return jsonify({'error': f'Failed to update reminder: {str(e)}'}), 500
+    # Collect the changed fields
+    updates = {}
+    if body.title is not None:
+        updates['title'] = body.title
+    if body.category or body.title is not None:
+        updates['category'] = title_category(body.title or '', body.category)
+    if 'description' in given:
+        updates['description'] = body.description
+    if reminder_time:
+        updates['timestamp'] = reminder_time
+        updates['timestampMs'] = timestamp_ms(reminder_time)
+    if body.is_completed is not None:
+        updates['isCompleted'] = body.is_completed
+    if 'image_url' in given:
+        updates['imageUrl'] = body.image_url
+    
+    # Write only the changed fields of the reminder document
+    if updates:
+        changed = change_reminders(patient_id, [reminder_id], updates)
+        reminder_response = changed[0] if changed else None
+    else:
+        reminder_doc = reminders_collection(patient_id).document(reminder_id).get()
+        reminder_response = reminder_doc.to_dict() if reminder_doc.exists else None
+    
+    if reminder_response is None:
+        return reminder_not_found(patient_id)
+    
+    return jsonify({
+        'reminder': reminder_response,
+        'message': 'Reminder updated successfully'
+    }), 200
 
 @reminder_bp.route('/<reminder_id>/complete', methods=['POST'])
 @token_required
@@ -336,45 +390,24 @@ def complete_reminder(reminder_id):
     Request body:
     - patient_id: string (required) - ID of the patient
     """
-    data = request.json
+    body, error = parse_body(PatientBody)
+    if error:
+        return jsonify({'error': error}), 400
     
-    if 'patient_id' not in data:
-        return jsonify({'error': 'Missing required field: patient_id'}), 400
+    patient_id = body.patient_id
     
-    patient_id = data['patient_id']
+    # Mark as completed
+    changed = change_reminders(patient_id, [reminder_id], {
+        'isCompleted': True,
+        'completedAt': firestore.SERVER_TIMESTAMP
+    })
+    if changed is None:
+        return reminder_not_found(patient_id)
     
-    try:
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Find the specific reminder
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        
-        reminder_index = next((i for i, r in enumerate(reminders) if r.get('id') == reminder_id), None)
-        
-        if reminder_index is None:
-            return jsonify({'error': 'Reminder not found'}), 404
-        
-        # Mark as completed
-        reminders[reminder_index]['isCompleted'] = True
-        reminders[reminder_index]['completedAt'] = firestore.SERVER_TIMESTAMP
-        
-        # Update user document
-        user_ref.update({'reminders': reminders})
-        
-        return jsonify({
-            'message': 'Reminder marked as completed',
-            'reminder_id': reminder_id
-        }), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Error completing reminder: {str(e)}")
-        return jsonify({'error': f'Failed to complete reminder: {str(e)}'}), 500
+    return jsonify({
+        'message': 'Reminder marked as completed',
+        'reminder_id': reminder_id
+    }), 200
 
 @reminder_bp.route('/<reminder_id>', methods=['DELETE'])
 @token_required
@@ -393,37 +426,70 @@ def delete_reminder(reminder_id):
     if not patient_id:
         return jsonify({'error': 'Missing required parameter: patient_id'}), 400
     
-    try:
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Find and remove the specific reminder
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        
-        reminder_index = next((i for i, r in enumerate(reminders) if r.get('id') == reminder_id), None)
-        
-        if reminder_index is None:
-            return jsonify({'error': 'Reminder not found'}), 404
-        
-        # Remove the reminder
-        del reminders[reminder_index]
-        
-        # Update user document
-        user_ref.update({'reminders': reminders})
-        
-        return jsonify({
-            'message': 'Reminder deleted successfully',
-            'reminder_id': reminder_id
-        }), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Error deleting reminder: {str(e)}")
-        return jsonify({'error': f'Failed to delete reminder: {str(e)}'}), 500
+    # Delete the reminder document
+    if change_reminders(patient_id, [reminder_id], None) is None:
+        return reminder_not_found(patient_id)
+    
+    return jsonify({
+        'message': 'Reminder deleted successfully',
+        'reminder_id': reminder_id
+    }), 200
+
+@reminder_bp.route('/complete_bulk', methods=['POST'])
+@token_required
+def complete_reminders_bulk():
+    """
+    Mark several reminders as completed
+    
+    Request body:
+    - patient_id: string (required) - ID of the patient
+    - reminder_ids: list of strings (required) - IDs of the reminders
+    """
+    body, error = parse_body(BulkReminderBody)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Reminders are written in one transaction; if any is missing, none
+    # are applied
+    reminder_ids = list(dict.fromkeys(body.reminder_ids))
+    changed = change_reminders(body.patient_id, reminder_ids, {
+        'isCompleted': True,
+        'completedAt': firestore.SERVER_TIMESTAMP
+    })
+    
+    if changed is None:
+        return jsonify({'error': 'One or more reminders not found'}), 404
+    
+    return jsonify({
+        'message': 'Reminders marked as completed',
+        'reminder_ids': reminder_ids
+    }), 200
+
+@reminder_bp.route('/delete_bulk', methods=['POST'])
+@token_required
+def delete_reminders_bulk():
+    """
+    Delete several reminders
+    
+    Request body:
+    - patient_id: string (required) - ID of the patient
+    - reminder_ids: list of strings (required) - IDs of the reminders
+    """
+    body, error = parse_body(BulkReminderBody)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Deletes require each reminder to exist, as for single deletes
+    reminder_ids = list(dict.fromkeys(body.reminder_ids))
+    changed = change_reminders(body.patient_id, reminder_ids, None)
+    
+    if changed is None:
+        return jsonify({'error': 'One or more reminders not found'}), 404
+    
+    return jsonify({
+        'message': 'Reminders deleted successfully',
+        'reminder_ids': reminder_ids
+    }), 200
 
 @reminder_bp.route('/upcoming', methods=['GET'])
 @token_required
@@ -437,61 +503,35 @@ def get_upcoming_reminders():
     - limit: integer (optional) - Maximum number of reminders to return (default: 10)
     """
     patient_id = request.args.get('patient_id')
-    hours = request.args.get('hours', 24, type=int)
-    limit = request.args.get('limit', 10, type=int)
+    hours = max(1, min(request.args.get('hours', 24, type=int), MAX_UPCOMING_HOURS))
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_REMINDER_PAGE))
     
     if not patient_id:
         return jsonify({'error': 'Missing required parameter: patient_id'}), 400
     
-    try:
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Calculate time window
-        now = datetime.now()
-        end_time = now + timedelta(hours=hours)
-        
-        # Find upcoming reminders
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        
-        upcoming_reminders = []
-        for reminder in reminders:
-            # Skip if timestamp is missing or reminder is completed
-            if 'timestamp' not in reminder or reminder.get('isCompleted', False):
-                continue
-                
-            reminder_time = reminder['timestamp']
-            
-            # Check if reminder is within the time window
-            if now <= reminder_time <= end_time:
-                upcoming_reminders.append(reminder)
-        
-        # Sort by timestamp (earliest first)
-        upcoming_reminders.sort(key=lambda r: r['timestamp'])
-        
-        # Limit the number of results
-        upcoming_reminders = upcoming_reminders[:limit]
-        
-        # Convert datetime objects to ISO strings for JSON serialization
-        for reminder in upcoming_reminders:
-            if 'timestamp' in reminder and isinstance(reminder['timestamp'], datetime):
-                reminder['timestamp'] = reminder['timestamp'].isoformat()
-            if 'createdAt' in reminder and isinstance(reminder['createdAt'], datetime):
-                reminder['createdAt'] = reminder['createdAt'].isoformat()
-        
-        return jsonify({
-            'reminders': upcoming_reminders,
-            'total': len(upcoming_reminders)
-        }), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving upcoming reminders: {str(e)}")
-        return jsonify({'error': f'Failed to retrieve upcoming reminders: {str(e)}'}), 500
+    # Calculate time window
+    now = datetime.now(timezone.utc)
+    end_time = now + timedelta(hours=hours)
+    
+    # Find upcoming reminders; Firestore applies the window, the sort
+    # (earliest first) and the limit, so at most `limit` are read
+    query = reminders_collection(patient_id) \
+        .where('isCompleted', '==', False) \
+        .where('timestampMs', '>=', timestamp_ms(now)) \
+        .where('timestampMs', '<=', timestamp_ms(end_time)) \
+        .order_by('timestampMs') \
+        .limit(limit)
+    
+    upcoming_reminders = [doc.to_dict() for doc in query.stream()]
+    
+    # An empty result may mean the patient doesn't exist
+    if not upcoming_reminders and not patient_exists(patient_id):
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    return jsonify({
+        'reminders': upcoming_reminders,
+        'total': len(upcoming_reminders)
+    }), 200
 
 @reminder_bp.route('/stats', methods=['GET'])
 @token_required
@@ -504,129 +544,46 @@ def get_reminder_stats():
     - days: integer (optional) - Number of days to analyze (default: 30)
     """
     patient_id = request.args.get('patient_id')
-    days = request.args.get('days', 30, type=int)
+    days = max(1, min(request.args.get('days', 30, type=int), MAX_STATS_DAYS))
     
     if not patient_id:
         return jsonify({'error': 'Missing required parameter: patient_id'}), 400
     
-    try:
-        # Get user document
-        user_ref = current_app.config['FIREBASE_DB'].collection('users').document(patient_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            return jsonify({'error': 'Patient not found'}), 404
-        
-        # Calculate time window
-        now = datetime.now()
-        start_time = now - timedelta(days=days)
-        
-        # Analyze reminders
-        user_data = user_doc.to_dict()
-        reminders = user_data.get('reminders', [])
-        
-        # Initialize statistics
-        stats = {
-            'total': 0,
-            'completed': 0,
-            'missed': 0,
-            'upcoming': 0,
-            'completion_rate': 0,
-            'by_category': {},
-            'daily_completion': [0] * (days + 1),  # One entry per day
-            'completion_trend': []
-        }
-        
-        # Categorize reminders
-        category_counts = {}
-        daily_reminders = {}
-        daily_completed = {}
-        
-        for reminder in reminders:
-            # Skip if timestamp is missing
-            if 'timestamp' not in reminder:
-                continue
-                
-            reminder_time = reminder['timestamp']
-            is_completed = reminder.get('isCompleted', False)
-            
-            # Get the reminder type/category (e.g., medication, appointment)
-            category = reminder.get('title', 'other').split()[0].lower()
-            
-            # Count by category
-            if category not in category_counts:
-                category_counts[category] = {'total': 0, 'completed': 0}
-            category_counts[category]['total'] += 1
-            if is_completed:
-                category_counts[category]['completed'] += 1
-            
-            # Check if reminder is within the analysis period
-            if start_time <= reminder_time <= now:
-                stats['total'] += 1
-                
-                # Count completed vs missed
-                if is_completed:
-                    stats['completed'] += 1
-                else:
-                    stats['missed'] += 1
-                
-                # Track daily completion
-                day_index = (now - reminder_time).days
-                if 0 <= day_index <= days:
-                    # Initialize daily counts if needed
-                    day_str = reminder_time.strftime('%Y-%m-%d')
-                    if day_str not in daily_reminders:
-                        daily_reminders[day_str] = 0
-                        daily_completed[day_str] = 0
-                    
-                    daily_reminders[day_str] += 1
-                    if is_completed:
-                        daily_completed[day_str] += 1
-            
-            # Count upcoming reminders
-            elif reminder_time > now and not is_completed:
-                stats['upcoming'] += 1
-        
-        # Calculate completion rate
-        if stats['total'] > 0:
-            stats['completion_rate'] = round((stats['completed'] / stats['total']) * 100, 1)
-        
-        # Format category statistics
-        for category, counts in category_counts.items():
-            completion_rate = 0
-            if counts['total'] > 0:
-                completion_rate = round((counts['completed'] / counts['total']) * 100, 1)
-            
-            stats['by_category'][category] = {
-                'total': counts['total'],
-                'completed': counts['completed'],
-                'completion_rate': completion_rate
-            }
-        
-        # Format daily completion trend
-        for i in range(days + 1):
-            day_date = now - timedelta(days=i)
-            day_str = day_date.strftime('%Y-%m-%d')
-            
-            total = daily_reminders.get(day_str, 0)
-            completed = daily_completed.get(day_str, 0)
-            rate = 0 if total == 0 else round((completed / total) * 100, 1)
-            
-            stats['completion_trend'].append({
-                'date': day_str,
-                'total': total,
-                'completed': completed,
-                'rate': rate
-            })
-        
-        # Sort trend by date (oldest first)
-        stats['completion_trend'].reverse()
-        
-        return jsonify({'stats': stats}), 200
-        
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving reminder statistics: {str(e)}")
-        return jsonify({'error': f'Failed to retrieve reminder statistics: {str(e)}'}), 500
+    # Reminder timestamps and the summary's daily buckets are in UTC
+    now = datetime.now(timezone.utc)
+    
+    # Counters are maintained on every reminder write, so the summary
+    # document replaces a scan of all reminders; only the upcoming count
+    # depends on the current time and is aggregated by Firestore
+    db = current_app.config['FIREBASE_DB']
+    summary_doc = stats_summary_ref(db, patient_id).get()
+    
+    if not summary_doc.exists and not patient_exists(patient_id):
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    now_ms = timestamp_ms(now)
+    upcoming_query = reminders_collection(patient_id) \
+        .where('isCompleted', '==', False) \
+        .where('timestampMs', '>', now_ms)
+    
+    # Today's counters include reminders due later today, which are
+    # upcoming rather than completed or missed
+    tomorrow = datetime.combine(now.date() + timedelta(days=1),
+                                datetime.min.time(), tzinfo=timezone.utc)
+    later_today_query = reminders_collection(patient_id) \
+        .where('timestampMs', '>', now_ms) \
+        .where('timestampMs', '<', timestamp_ms(tomorrow))
+    later_completed_query = later_today_query.where('isCompleted', '==', True)
+    not_yet_due = {
+        'total': later_today_query.count().get()[0][0].value,
+        'completed': later_completed_query.count().get()[0][0].value
+    }
+    
+    stats = compute_stats(summary_doc.to_dict() or {}, now.date(), days,
+                          not_yet_due)
+    stats['upcoming'] = upcoming_query.count().get()[0][0].value
+    
+    return jsonify({'stats': stats}), 200
 
 def init_app(app):
     """Initialize the blueprint with the Flask app"""
@@ -0,0 +1,89 @@
+from typing import Any, List, Literal, Optional
+
+from flask import request
+from pydantic import BaseModel, Field, ValidationError
+
+# Firestore batches and transactions are limited to 500 writes; one is kept
+# for the stats summary, so a bulk reminder change fits in one transaction
+REMINDER_WRITE_CHUNK = 499
+
+# Request bodies of the JSON POST routes. Bodies are parsed and validated in
+# one pass by pydantic-core, replacing request.json and per-field checks.
+class MessageBody(BaseModel):
+    patient_id: str
+    message: str
+
+
+class ReminderBody(BaseModel):
+    patient_id: str
+    title: str
+    description: str
+    timestamp: str
+    category: Optional[str] = None
+    message_id: Optional[str] = None
+    image_url: Optional[str] = None
+
+
+class ReminderUpdateBody(BaseModel):
+    patient_id: str
+    title: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    timestamp: Optional[str] = None
+    is_completed: Optional[bool] = None
+    image_url: Optional[str] = None
+
+
+class PatientBody(BaseModel):
+    patient_id: str
+
+
+class BulkReminderBody(BaseModel):
+    patient_id: str
+    reminder_ids: List[str] = Field(min_length=1,
+                                    max_length=REMINDER_WRITE_CHUNK)
+
+
+class SignupBody(BaseModel):
+    email: str
+    password: str
+    username: Optional[str] = None
+    display_name: Optional[str] = None
+    birth_date: Any = None
+    diagnosis_type: Any = None
+
+
+class LoginBody(BaseModel):
+    email: str
+    password: str
+
+
+class GenerateQuizBody(BaseModel):
+    patient_id: str
+    quiz_type: Literal['memory', 'conversation', 'mixed', 'general'] = 'mixed'
+    question_count: int = Field(default=5, ge=1, le=10)
+
+
+class QuizAnswerBody(BaseModel):
+    quiz_id: str
+    question_id: str
+    selected_option: Literal['A', 'B', 'C', 'D']
+
+
+def parse_body(model):
+    """
+    Parse and validate the JSON request body
+
+    Returns:
+        Tuple of (body, None) on success or (None, error message) otherwise
+    """
+    try:
+        return model.model_validate_json(request.get_data()), None
+    except ValidationError as e:
+        error = e.errors()[0]
+        field = '.'.join(str(part) for part in error['loc'])
+        if error['type'] == 'missing':
+            return None, f'Missing required field: {field}'
+        if not field:
+            return None, 'Request body must be a JSON object'
+        return None, f'Invalid field {field}: {error["msg"]}'
@@ -0,0 +1,36 @@
+import hashlib
+import threading
+import time
+
+from cachetools import TTLCache
+from flask import current_app
+
+# Verified tokens, so repeat requests (clients poll) skip the signature check.
+# Entries are keyed by a digest of the token and still expire with the token
+# itself.
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60  # seconds
+_id_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+_id_token_cache_lock = threading.Lock()
+
+
+def token_cache_key(token):
+    """Fixed-size digest of a token, used as its cache key"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def verify_id_token(token, verifier):
+    """
+    Verify an ID token with current_app.<verifier>.verify_id_token, reusing
+    the result for repeat requests until the token's exp passes
+    """
+    cache_key = (verifier, token_cache_key(token))
+    with _id_token_cache_lock:
+        decoded = _id_token_cache.get(cache_key)
+
+    if decoded is None or decoded.get('exp', 0) <= time.time():
+        decoded = getattr(current_app, verifier).verify_id_token(token)
+        with _id_token_cache_lock:
+            _id_token_cache[cache_key] = decoded
+
+    return decoded
@@ -1,27 +1,172 @@
 # test_rag_system.py
 
+import asyncio
 import os
 import json
+import platform
+import shutil
+import subprocess
 import base64
 import tempfile
+import wave
+from collections import OrderedDict
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from google_rag_system import MementoRAGSystem
 
 # Import Google Cloud services
 from google.cloud import speech_v1p1beta1 as speech
+from google.cloud import speech_v2
+from google.cloud.speech_v2.types import cloud_speech
 from google.cloud import storage
 from dotenv import load_dotenv
 
 from firebase_init import db as firebase_db
 
-from google_rag_system import MementoRAGSystem
+from embedding_cache import EmbeddingCache
+from google_rag_system import EMBEDDING_MODEL_NAME, MementoRAGSystem
 
 load_dotenv()
 
+# Retrieved memories kept by CachedRAG, and the largest cosine distance at
+# which a new query reuses the memories of an earlier one
+SEMANTIC_CACHE_SIZE = 128
+SEMANTIC_CACHE_MAX_DISTANCE = 0.05
+
+
+# Output files are named from the start time of the run plus a counter, so
+# responses within the same second don't overwrite each other
+RUN_STAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
+_output_counter = itertools.count()
+
+
+def output_filename(prefix, extension):
+    """Unique file name for an output of this run"""
+    return f"{prefix}_{RUN_STAMP}_{next(_output_counter)}.{extension}"
+
+
+# Embeddings of the test queries, kept across runs
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL_NAME)
+
+
+class CachedRAG(MementoRAGSystem):
+    """
+    RAG system that reuses the memories retrieved for an earlier query of
+    the same patient when the new query's embedding is nearly identical, so
+    rephrased test queries skip the vector search. Embeddings come from the
+    on-disk embedding cache when the same text was embedded before.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (patient_id, limit, entry number) -> (unit query vector, memories),
+        # in least recently used order
+        self._memory_cache = OrderedDict()
+        self._memory_cache_entries = 0
+
+    def generate_embedding(self, text):
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts):
+        # Only texts that aren't cached are sent, together in one request
+        embeddings = [embedding_cache.get(text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            generated = super().generate_embeddings([texts[i] for i in missing])
+            for i, embedding in zip(missing, generated):
+                embeddings[i] = embedding_cache.put(texts[i], embedding)
+        return [embedding.tolist() for embedding in embeddings]
+
+    def retrieve_memories_with_embedding(self, patient_id, query_embedding,
+                                         limit=5):
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if not np.isfinite(norm) or norm == 0:
+            # An empty or zero query matches nothing and isn't cached
+            return []
+        query_vector /= norm
+
+        # Cosine distance to every cached query of this patient in one
+        # matrix-vector product
+        keys = [
+            key for key in self._memory_cache
+            if key[0] == patient_id and key[1] == limit
+        ]
+        if keys:
+            cached = np.stack([self._memory_cache[key][0] for key in keys])
+            distances = 1.0 - cached @ query_vector
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= SEMANTIC_CACHE_MAX_DISTANCE:
+                self._memory_cache.move_to_end(keys[nearest])
+                print("(reusing memories of a similar earlier query)")
+                return self._memory_cache[keys[nearest]][1]
+
+        memories = super().retrieve_memories_with_embedding(
+            patient_id, query_vector.tolist(), limit)
+        self._memory_cache_entries += 1
+        self._memory_cache[(patient_id, limit, self._memory_cache_entries)] = (
+            query_vector, memories)
+        if len(self._memory_cache) > SEMANTIC_CACHE_SIZE:
+            self._memory_cache.popitem(last=False)
+        return memories
+
+
+# The harness shares one RAG system and one client per Google Cloud service,
+# so running several tests doesn't set up their channels and auth again
+
+@lru_cache(maxsize=1)
+def get_rag():
+    """Shared RAG system for the tests"""
+    return CachedRAG()
+
+
+@lru_cache(maxsize=1)
+def get_storage_client():
+    """Shared Cloud Storage client"""
+    return storage.Client()
+
+
+@lru_cache(maxsize=1)
+def get_speech_client():
+    """Shared Speech-to-Text client"""
+    return speech.SpeechClient()
+
+
+@lru_cache(maxsize=1)
+def get_speech_v2_client():
+    """Shared Speech-to-Text v2 client"""
+    return speech_v2.SpeechClient()
+
+
+def save_audio_response(audio_file, audio_response):
+    """
+    Decode a base64 audio response and write it to audio_file with
+    unbuffered writes, since the bytes are already in memory
+    """
+    data = memoryview(base64.b64decode(audio_response))
+    fd = os.open(audio_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
 
 def load_sample_ids():
     """Load sample IDs from the generated JSON file"""
     try:
+        if orjson is not None:
+            with open("sample_ids.json", "rb") as f:
+                return orjson.loads(f.read())
         with open("sample_ids.json", "r") as f:
             return json.load(f)
     except Exception as e:
@@ -34,7 +179,7 @@ def test_text_processing():
     print("\n=== Testing Text Processing ===")
 
     # Initialize the RAG system
-    rag = MementoRAGSystem()
+    rag = get_rag()
 
     # Load sample patient IDs
     samples = load_sample_ids()
@@ -69,13 +214,12 @@ def test_text_processing():
 
         # Check if audio response is available
         if "audioResponse" in result:
-            audio_file = f"test_response_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-            with open(audio_file, "wb") as f:
-                f.write(base64.b64decode(result["audioResponse"]))
+            audio_file = output_filename("test_response", "mp3")
+            save_audio_response(audio_file, result["audioResponse"])
             print(f"\nAudio response saved to: {audio_file}")
 
 
-def test_audio_processing():
+async def test_audio_processing():
     """Test the RAG system with an audio file"""
     print("\n=== Testing Audio Processing ===")
 
@@ -88,9 +232,6 @@ def test_audio_processing():
         )
         return
 
-    # Initialize the RAG system
-    rag = MementoRAGSystem()
-
     # Load sample patient IDs
     samples = load_sample_ids()
     if not samples or not samples.get("patients"):
@@ -101,15 +242,23 @@ def test_audio_processing():
     patient_id = samples["patients"][0]
     print(f"Using patient ID: {patient_id}")
 
-    # Read the audio file
-    with open(test_audio_file, "rb") as f:
-        audio_content = f.read()
+    def read_audio():
+        with open(test_audio_file, "rb") as f:
+            return f.read()
+
+    # Read the audio file while the RAG system is initialized
+    audio_content, rag = await asyncio.gather(
+        asyncio.to_thread(read_audio), asyncio.to_thread(get_rag))
 
     print(f"Using audio file: {test_audio_file}")
 
-    # Process the audio
+    # Process the audio; the text-to-speech client for the reply is created
+    # while speech-to-text and the response generation run
     print("Processing audio...")
-    result = rag.process_audio_message(patient_id, audio_content)
+    result, _ = await asyncio.gather(
+        asyncio.to_thread(rag.process_audio_message, patient_id,
+                          audio_content),
+        asyncio.to_thread(getattr, rag, "tts_client"))
 
     # Display results
     if "error" in result:
@@ -128,9 +277,8 @@ def test_audio_processing():
 
         # Check if audio response is available
         if "audioResponse" in result:
-            audio_file = f"test_response_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-            with open(audio_file, "wb") as f:
-                f.write(base64.b64decode(result["audioResponse"]))
+            audio_file = output_filename("test_response", "mp3")
+            save_audio_response(audio_file, result["audioResponse"])
             print(f"\nAudio response saved to: {audio_file}")
 
 
@@ -139,7 +287,7 @@ def test_memory_retrieval():
     print("\n=== Testing Memory Retrieval ===")
 
     # Initialize the RAG system
-    rag = MementoRAGSystem()
+    rag = get_rag()
 
     # Load sample patient IDs
     samples = load_sample_ids()
@@ -157,10 +305,13 @@ def test_memory_retrieval():
         "Where did I grow up?", "What did we talk about yesterday?"
     ]
 
-    # Test each query
-    for query in test_queries:
+    # Embed all the queries in one request, then test each query
+    query_embeddings = rag.generate_embeddings(test_queries)
+    for query, query_embedding in zip(test_queries, query_embeddings):
         print(f"\nQuery: '{query}'")
-        memories = rag.retrieve_memories(patient_id, query, limit=3)
+        memories = rag.retrieve_memories_with_embedding(patient_id,
+                                                        query_embedding,
+                                                        limit=3)
 
         print("Retrieved Memories:")
         for i, memory in enumerate(memories):
@@ -174,37 +325,46 @@ def test_speech_processing():
     print("\n=== Testing Speech Processing ===")
 
     # Initialize the RAG system
-    rag = MementoRAGSystem()
+    rag = get_rag()
 
-    # Test text-to-speech
-    print("Testing text-to-speech...")
     test_text = "Hello, this is a test of the speech synthesis capability of the Memento system."
-    try:
-        audio_content = rag.text_to_speech(test_text)
-        audio_file = f"tts_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-        with open(audio_file, "wb") as f:
-            f.write(audio_content)
-        print(f"Audio saved to: {audio_file}")
-    except Exception as e:
-        print(f"Error in text-to-speech: {e}")
-
-    # Test speech-to-text if test audio file is available
     test_audio_file = "test_audio.wav"
-    if os.path.exists(test_audio_file):
-        print("\nTesting speech-to-text...")
-        try:
-            with open(test_audio_file, "rb") as f:
-                audio_content = f.read()
 
-            transcript = rag.speech_to_text(audio_content)
-            print(f"Transcription: '{transcript}'")
+    def read_and_transcribe():
+        with open(test_audio_file, "rb") as f:
+            return rag.speech_to_text(f.read())
+
+    # The two API calls are independent, so run them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        tts_future = executor.submit(rag.text_to_speech, test_text)
+        stt_future = None
+        if os.path.exists(test_audio_file):
+            stt_future = executor.submit(read_and_transcribe)
+
+        # Test text-to-speech
+        print("Testing text-to-speech...")
+        try:
+            audio_content = tts_future.result()
+            audio_file = output_filename("tts_test", "mp3")
+            with open(audio_file, "wb") as f:
+                f.write(audio_content)
+            print(f"Audio saved to: {audio_file}")
         except Exception as e:
-            print(f"Error in speech-to-text: {e}")
-    else:
-        print(
-            f"\nSkipping speech-to-text test. Test audio file not found: {test_audio_file}"
-        )
-        print("Upload a test audio file to test this functionality.")
+            print(f"Error in text-to-speech: {e}")
+
+        # Test speech-to-text if test audio file is available
+        if stt_future is not None:
+            print("\nTesting speech-to-text...")
+            try:
+                transcript = stt_future.result()
+                print(f"Transcription: '{transcript}'")
+            except Exception as e:
+                print(f"Error in speech-to-text: {e}")
+        else:
+            print(
+                f"\nSkipping speech-to-text test. Test audio file not found: {test_audio_file}"
+            )
+            print("Upload a test audio file to test this functionality.")
 
 
 def test_sentiment_analysis():
@@ -212,7 +372,7 @@ def test_sentiment_analysis():
     print("\n=== Testing Sentiment Analysis ===")
 
     # Initialize the RAG system
-    rag = MementoRAGSystem()
+    rag = get_rag()
 
     # Test messages with different sentiments
     test_messages = [
@@ -222,22 +382,51 @@ def test_sentiment_analysis():
         "The doctor said my condition is stable but I need to continue my treatment."
     ]
 
-    for message in test_messages:
-        print(f"\nAnalyzing: '{message}'")
-        try:
-            sentiment_data = rag.analyze_sentiment(message)
-
-            print(f"Sentiment: {sentiment_data.get('category', 'unknown')}")
-            print(f"Score: {sentiment_data.get('score', 0):.2f}")
-            print(f"Magnitude: {sentiment_data.get('magnitude', 0):.2f}")
-
-            print("Entities:")
-            for entity_type, entities in sentiment_data.get('entities',
-                                                            {}).items():
-                if entities:
-                    print(f"  {entity_type}: {', '.join(entities)}")
-        except Exception as e:
-            print(f"Error in sentiment analysis: {e}")
+    # Each message is an independent API call, so analyze them all at once
+    # and print the results as they arrive
+    with ThreadPoolExecutor(max_workers=len(test_messages)) as executor:
+        futures = {
+            executor.submit(rag.analyze_sentiment, message): message
+            for message in test_messages
+        }
+        for future in as_completed(futures):
+            print(f"\nAnalyzing: '{futures[future]}'")
+            try:
+                sentiment_data = future.result()
+
+                print(f"Sentiment: {sentiment_data.get('category', 'unknown')}")
+                print(f"Score: {sentiment_data.get('score', 0):.2f}")
+                print(f"Magnitude: {sentiment_data.get('magnitude', 0):.2f}")
+
+                print("Entities:")
+                for entity_type, entities in sentiment_data.get('entities',
+                                                                {}).items():
+                    if entities:
+                        print(f"  {entity_type}: {', '.join(entities)}")
+            except Exception as e:
+                print(f"Error in sentiment analysis: {e}")
+
+
+# Size of each request of a resumable audio upload (a multiple of 256 KiB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Buckets known to exist, by name
+_bucket_cache = {}
+
+
+def get_or_create_bucket(storage_client, bucket_name):
+    """
+    Get a bucket handle, creating the bucket if needed. Existence is checked
+    once per process; the handle itself is built locally without a request.
+    """
+    bucket = _bucket_cache.get(bucket_name)
+    if bucket is None:
+        bucket = storage_client.bucket(bucket_name)
+        if not bucket.exists():
+            print(f"Bucket {bucket_name} does not exist. Creating...")
+            bucket = storage_client.create_bucket(bucket_name)
+        _bucket_cache[bucket_name] = bucket
+    return bucket
 
 
 def upload_audio_to_cloud(local_file_path, bucket_name=None):
@@ -249,21 +438,22 @@ def upload_audio_to_cloud(local_file_path, bucket_name=None):
                                          "memento-test-audio")
 
         # Create a unique blob name
-        blob_name = f"test_audio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+        blob_name = output_filename("test_audio", "wav")
 
         # Initialize client
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
 
-        # Check if bucket exists, create if it doesn't
-        try:
-            bucket = storage_client.get_bucket(bucket_name)
-        except Exception:
-            print(f"Bucket {bucket_name} does not exist. Creating...")
-            bucket = storage_client.create_bucket(bucket_name)
+        # Get the bucket, creating it if it doesn't exist
+        bucket = get_or_create_bucket(storage_client, bucket_name)
 
-        # Upload file
-        blob = bucket.blob(blob_name)
-        blob.upload_from_filename(local_file_path)
+        # Upload file as a resumable upload streamed from disk in 1 MiB
+        # chunks; blob names are new, so require that no object exists
+        # rather than looking it up first
+        blob = bucket.blob(blob_name, chunk_size=UPLOAD_CHUNK_SIZE)
+        with open(local_file_path, "rb") as f:
+            blob.upload_from_file(f,
+                                  content_type="audio/wav",
+                                  if_generation_match=0)
 
         gcs_uri = f"gs://{bucket_name}/{blob_name}"
         print(f"File uploaded to: {gcs_uri}")
@@ -274,33 +464,130 @@ def upload_audio_to_cloud(local_file_path, bucket_name=None):
         return None
 
 
+def batch_transcribe_gcs_audio(gcs_uris, dynamic_batching=True):
+    """
+    Start a Speech-to-Text v2 batch transcription of audio files in Google
+    Cloud Storage, returning the operation; call .result() on it to wait.
+
+    Many files can be sent in one call. With dynamic_batching the job is
+    scheduled whenever capacity is available (within 24 hours) at a lower
+    price, which suits bulk regression samples but not interactive use.
+    """
+    project_id = os.getenv("GCP_PROJECT_ID", "test-project-id")
+    client = get_speech_v2_client()
+
+    strategy = cloud_speech.BatchRecognizeRequest.ProcessingStrategy
+    request = cloud_speech.BatchRecognizeRequest(
+        recognizer=f"projects/{project_id}/locations/global/recognizers/_",
+        config=cloud_speech.RecognitionConfig(
+            auto_decoding_config=cloud_speech.AutoDetectDecodingConfig(),
+            language_codes=["en-US"],
+            model="long",
+            features=cloud_speech.RecognitionFeatures(
+                enable_automatic_punctuation=True)),
+        files=[
+            cloud_speech.BatchRecognizeFileMetadata(uri=uri)
+            for uri in gcs_uris
+        ],
+        recognition_output_config=cloud_speech.RecognitionOutputConfig(
+            inline_response_config=cloud_speech.InlineOutputConfig()),
+        processing_strategy=(strategy.DYNAMIC_BATCHING if dynamic_batching
+                             else strategy.PROCESSING_STRATEGY_UNSPECIFIED))
+    return client.batch_recognize(request=request)
+
+
+def batch_transcripts(response):
+    """Get the transcript of each file in a batch transcription response"""
+    return {
+        uri: "".join(result.alternatives[0].transcript
+                     for result in file_result.inline_result.transcript.results
+                     if result.alternatives)
+        for uri, file_result in response.results.items()
+    }
+
+
 def transcribe_gcs_audio(gcs_uri):
     """Transcribe audio file from Google Cloud Storage"""
     try:
-        client = speech.SpeechClient()
-
-        audio = speech.RecognitionAudio(uri=gcs_uri)
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-            sample_rate_hertz=16000,
-            language_code="en-US",
-            enable_automatic_punctuation=True,
-            model="latest_long")
-
-        operation = client.long_running_recognize(config=config, audio=audio)
+        # A single file is transcribed right away rather than dynamically
+        # batched, since the caller waits for it
+        operation = batch_transcribe_gcs_audio([gcs_uri],
+                                               dynamic_batching=False)
         print("Waiting for operation to complete...")
         response = operation.result(timeout=90)
 
-        transcript = ""
-        for result in response.results:
-            transcript += result.alternatives[0].transcript
-
-        return transcript
+        return batch_transcripts(response).get(gcs_uri, "")
     except Exception as e:
         print(f"Error transcribing audio: {e}")
         return None
 
 
+def stream_transcribe(audio_chunks, sample_rate_hertz=16000, channels=1,
+                      single_utterance=False):
+    """
+    Transcribe 16-bit PCM audio with streaming recognition, sending it as it
+    is read. With single_utterance (for live input) the transcript is
+    returned as soon as the end of the first utterance has been recognized;
+    otherwise the transcripts of all utterances are joined.
+    """
+    client = get_speech_client()
+    streaming_config = speech.StreamingRecognitionConfig(
+        config=speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=sample_rate_hertz,
+            audio_channel_count=channels,
+            language_code="en-US",
+            enable_automatic_punctuation=True),
+        single_utterance=single_utterance)
+
+    requests = (speech.StreamingRecognizeRequest(audio_content=chunk)
+                for chunk in audio_chunks)
+    responses = client.streaming_recognize(config=streaming_config,
+                                           requests=requests)
+    transcripts = []
+    for response in responses:
+        for result in response.results:
+            if result.is_final:
+                transcripts.append(result.alternatives[0].transcript.strip())
+                if single_utterance:
+                    return transcripts[0]
+    return " ".join(transcripts)
+
+
+def transcribe_wav_file(path, frame_ms=20):
+    """Stream a 16-bit PCM WAV file to speech recognition in frame_ms audio frames"""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(
+                f"{path} has {8 * wav.getsampwidth()}-bit samples; "
+                "only 16-bit PCM WAV files are supported")
+        sample_rate = wav.getframerate()
+        frames_per_chunk = sample_rate * frame_ms // 1000
+        chunks = iter(lambda: wav.readframes(frames_per_chunk), b"")
+        return stream_transcribe(chunks, sample_rate, wav.getnchannels())
+
+
+# Linux ioctl that clones a file's extents into another (btrfs, XFS)
+FICLONE = 0x40049409
+
+
+def copy_audio_file(src, dst):
+    """
+    Copy an audio file as a copy-on-write clone where the filesystem
+    supports it, otherwise with shutil's in-kernel copy (sendfile/fcopyfile)
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+    try:
+        import fcntl
+        with open(src, "rb") as source, open(dst, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src, dst)
+
+
 def upload_test_audio():
     """Upload an existing audio file for testing"""
     print("\n=== Upload Test Audio File ===")
@@ -317,9 +604,8 @@ def upload_test_audio():
     local_option = input(
         "Do you want to copy this file locally as test_audio.wav? (y/n): ")
     if local_option.lower() == 'y':
-        import shutil
         try:
-            shutil.copy(file_path, "test_audio.wav")
+            copy_audio_file(file_path, "test_audio.wav")
             print("File copied to test_audio.wav")
         except Exception as e:
             print(f"Error copying file: {e}")
@@ -356,12 +642,30 @@ def use_cloud_speech_recognition():
     print("   https://cloud.google.com/speech-to-text")
 
 
+# Command that opens an audio file with the platform's player
+AUDIO_PLAYERS = {
+    "Windows": ["cmd", "/c", "start", "", "/min"],
+    "Darwin": ["afplay"],
+}
+AUDIO_PLAYER = AUDIO_PLAYERS.get(platform.system(), ["xdg-open"])
+
+
+def play_audio(audio_file):
+    """Start playing an audio file without waiting for it to finish"""
+    try:
+        subprocess.Popen(AUDIO_PLAYER + [audio_file],
+                         stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+    except OSError:
+        print("Could not automatically play the audio.")
+
+
 def interactive_chat():
     """Interactive chat session for testing"""
     print("\n=== Interactive Chat Session ===")
 
-    project_id = os.getenv("GCP_PROJECT_ID", "test-project-id")
-    rag = MementoRAGSystem(project_id=project_id, db=firebase_db)
+    rag = get_rag()
 
     # Load sample patient IDs
     samples = load_sample_ids()
@@ -369,19 +673,24 @@ def interactive_chat():
         print("No sample patients available. Please check sample_ids.json")
         return
 
-    # Show available patients
+    # Show available patients, fetched in a single batched read. get_all
+    # doesn't keep the order of the references, so results are keyed by ID.
     print("\nAvailable patients:")
-    for i, patient_id in enumerate(samples.get("patients", [])):
-        try:
-            from firebase_admin import firestore
-            db = firestore.client()
-            patient_doc = db.collection("users").document(patient_id).get()
-            if patient_doc.exists:
-                patient = patient_doc.to_dict()
-                print(
-                    f"{i+1}. {patient.get('displayName')} (ID: {patient_id})")
-        except Exception as e:
-            print(f"Error loading patient {patient_id}: {e}")
+    patients = {}
+    try:
+        refs = [
+            firebase_db.collection("users").document(patient_id)
+            for patient_id in samples["patients"]
+        ]
+        for snapshot in firebase_db.get_all(refs):
+            if snapshot.exists:
+                patients[snapshot.id] = snapshot.to_dict()
+    except Exception as e:
+        print(f"Error loading patients: {e}")
+    for i, patient_id in enumerate(samples["patients"]):
+        if patient_id in patients:
+            print(f"{i+1}. {patients[patient_id].get('displayName')} "
+                  f"(ID: {patient_id})")
 
     # Select a patient
     selection = input(
@@ -393,10 +702,10 @@ def interactive_chat():
         else:
             patient_id = samples.get("patients")[0]
 
-        from firebase_admin import firestore
-        db = firestore.client()
-        patient_doc = db.collection("users").document(patient_id).get()
-        patient = patient_doc.to_dict()
+        patient = patients.get(patient_id)
+        if patient is None:
+            patient = firebase_db.collection("users").document(
+                patient_id).get().to_dict()
         print(f"\nChatting with {patient.get('displayName')}")
     except Exception as e:
         print(f"Error selecting patient: {e}")
@@ -433,17 +742,20 @@ def interactive_chat():
                 continue
 
             print(f"Processing audio file: {audio_file_path}")
-            with open(audio_file_path, "rb") as f:
-                audio_content = f.read()
-
-            print("Processing...")
-            result = rag.process_audio_message(patient_id, audio_content)
+            try:
+                transcript = transcribe_wav_file(audio_file_path)
+            except Exception as e:
+                print(f"Error transcribing audio: {e}")
+                continue
 
-            if "error" in result:
-                print(f"Error: {result['error']}")
+            if not transcript:
+                print("Error: No speech recognized in the audio file")
                 continue
 
-            print(f"You (transcribed): {result.get('message', '')}")
+            print(f"You (transcribed): {transcript}")
+
+            print("Processing...")
+            result = rag.process_text_message(patient_id, transcript)
 
         else:
             # Process the text message
@@ -462,24 +774,13 @@ def interactive_chat():
 
             # Play and save audio response
             if "audioResponse" in result:
-                audio_file = f"response_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-                with open(audio_file, "wb") as f:
-                    f.write(base64.b64decode(result["audioResponse"]))
+                audio_file = output_filename("response", "mp3")
+                save_audio_response(audio_file, result["audioResponse"])
                 print(f"(Audio response saved to: {audio_file})")
 
-                # Try to play the audio (platform-dependent)
-                try:
-                    import platform
-                    system = platform.system()
-
-                    if system == "Windows":
-                        os.system(f"start {audio_file}")
-                    elif system == "Darwin":  # macOS
-                        os.system(f"afplay {audio_file}")
-                    else:  # Linux
-                        os.system(f"xdg-open {audio_file}")
-                except:
-                    print("Could not automatically play the audio.")
+                # Playback doesn't block, so the prompt for the next
+                # message appears right away
+                play_audio(audio_file)
 
     print("\n=== Chat Session Ended ===")
 
@@ -501,7 +802,7 @@ if __name__ == "__main__":
     if choice == "1":
         test_text_processing()
     elif choice == "2":
-        test_audio_processing()
+        asyncio.run(test_audio_processing())
     elif choice == "3":
         test_memory_retrieval()
     elif choice == "4":
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+import orjson
+from flask import Flask, jsonify
+
+import app as app_module
+from app import MementoJSONProvider
+
+
+def make_app(debug=False):
+    """Bare Flask app using the Memento JSON provider"""
+    flask_app = Flask(__name__)
+    flask_app.json = MementoJSONProvider(flask_app)
+    flask_app.debug = debug
+    return flask_app
+
+
+def test_jsonify_uses_orjson():
+    """jsonify responses are encoded by orjson, in compact and debug mode"""
+    for debug in (False, True):
+        flask_app = make_app(debug)
+        with mock.patch.object(app_module.orjson, "dumps",
+                               wraps=orjson.dumps) as dumps:
+            with flask_app.app_context():
+                response = jsonify({"b": 1, "a": [1, 2]})
+        assert dumps.call_count == 1
+        assert response.get_json() == {"a": [1, 2], "b": 1}
+        assert (b"\n  " in response.data) == debug
+
+
+def test_jsonify_writes_datetimes_as_iso():
+    """Datetimes, including Firestore's datetime subclass, are ISO 8601"""
+
+    class DatetimeWithNanoseconds(datetime):
+        pass
+
+    when = DatetimeWithNanoseconds(2025, 3, 1, 9, 30, tzinfo=timezone.utc)
+    with make_app().app_context():
+        response = jsonify({"timestamp": when})
+    assert response.get_json() == {"timestamp": "2025-03-01T09:30:00+00:00"}
+
+
+if __name__ == "__main__":
+    test_jsonify_uses_orjson()
+    test_jsonify_writes_datetimes_as_iso()
+    print("✅ JSON provider tests passed")
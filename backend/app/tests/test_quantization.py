@@ -0,0 +1,123 @@
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from app.google_rag_system import (MementoRAGSystem, load_memory_chunks,
+                                   quantize_rows)
+
+
+class FakeDoc:
+    """Firestore document snapshot with only what the loader reads"""
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.reference = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDb:
+    """
+    Firestore client serving one patient's chunks: stored fields for the
+    selected stream, and legacy float vectors for get_all
+    """
+
+    def __init__(self, chunks, vectors=None):
+        self.chunks = chunks
+        self.vectors = vectors or {}
+
+    def collection(self, name):
+        return self
+
+    def document(self, name):
+        return self
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        return [FakeDoc(doc_id, data) for doc_id, data in self.chunks.items()]
+
+    def get_all(self, refs, field_paths=None):
+        return [FakeDoc(ref, self.vectors.get(ref, {})) for ref in refs]
+
+
+def stored_chunk(vector):
+    """Chunk fields as populate_database writes them for a unit vector"""
+    rows_i8, scales = quantize_rows(np.array([vector], dtype=np.float32))
+    return {
+        'summary': 'memory',
+        'vector_i8': rows_i8[0].tobytes(),
+        'vector_scale': float(scales[0])
+    }
+
+
+def test_quantize_rows_round_trips_within_half_a_step():
+    """Dequantized rows are within half a quantization step of the input"""
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((8, 16)).astype(np.float32)
+
+    rows_i8, scales = quantize_rows(matrix)
+    assert rows_i8.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(rows_i8).max(axis=1).tolist() == [127] * 8
+
+    restored = rows_i8.astype(np.float32) * scales[:, None]
+    assert np.all(np.abs(restored - matrix) <= scales[:, None] / 2 + 1e-6)
+
+
+def test_quantize_rows_keeps_zero_rows_finite():
+    """An all-zero row quantizes to zeros with a scale of 1, not NaN"""
+    rows_i8, scales = quantize_rows(np.zeros((2, 4), dtype=np.float32))
+    assert not rows_i8.any()
+    assert scales.tolist() == [1.0, 1.0]
+
+
+def test_load_memory_chunks_skips_zero_vectors():
+    """Zero int8 and float vectors are left out of the scan"""
+    db = FakeDb(
+        {
+            'stored': dict(stored_chunk([0.6, 0.8]), id='stored'),
+            'stored_zero': {'id': 'stored_zero', 'vector_i8': bytes(2),
+                            'vector_scale': 1.0},
+            'legacy': {'id': 'legacy'},
+            'legacy_zero': {'id': 'legacy_zero'}
+        },
+        vectors={
+            'legacy': {'vector': [3.0, 4.0]},
+            'legacy_zero': {'vector': [0.0, 0.0]}
+        })
+
+    matrix_i8, scales, chunks = load_memory_chunks(db, 'patient', 2, None)
+    assert [chunk['id'] for chunk in chunks] == ['stored', 'legacy']
+    assert all('vector_i8' not in chunk for chunk in chunks)
+
+    # Both rows are the unit vector (0.6, 0.8)
+    restored = matrix_i8.astype(np.float32) * scales[:, None]
+    assert np.allclose(restored, [[0.6, 0.8], [0.6, 0.8]], atol=0.01)
+
+
+def test_fallback_scan_rejects_zero_query():
+    """A zero query embedding matches nothing and reads no chunks"""
+    rag = MementoRAGSystem.__new__(MementoRAGSystem)
+    rag.db = SimpleNamespace()
+    rag._get_pooled_db = None
+    rag.vector_cls = None
+    rag.fallback_hits = 0
+    rag._memory_matrix = mock.Mock()
+
+    with mock.patch.dict(os.environ, {"ALLOW_SLOW_FALLBACK": "1"}):
+        assert rag.retrieve_memories_with_embedding('patient', [0.0] * 4) == []
+        assert rag.retrieve_memories_with_embedding('patient', []) == []
+    rag._memory_matrix.assert_not_called()
+
+
+if __name__ == "__main__":
+    test_quantize_rows_round_trips_within_half_a_step()
+    test_quantize_rows_keeps_zero_rows_finite()
+    test_load_memory_chunks_skips_zero_vectors()
+    test_fallback_scan_rejects_zero_query()
+    print("✅ Quantization tests passed")
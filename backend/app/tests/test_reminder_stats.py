@@ -0,0 +1,119 @@
+from datetime import date, datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+from app.db.reminder_stats import (add_to_summary, build_summary,
+                                   compute_stats, summary_increments,
+                                   timestamp_ms)
+
+
+def make_reminder(title, day, completed=False, category=None):
+    """Reminder dict as stored in Firestore, due at 09:00 UTC on day"""
+    reminder = {
+        'title': title,
+        'timestamp': datetime(day.year, day.month, day.day, 9,
+                              tzinfo=timezone.utc),
+        'isCompleted': completed
+    }
+    if category:
+        reminder['category'] = category
+    return reminder
+
+
+def test_timestamp_ms_treats_naive_datetimes_as_utc():
+    """Naive and UTC-aware datetimes give the same epoch milliseconds"""
+    naive = datetime(2025, 3, 1, 9, 30)
+    aware = naive.replace(tzinfo=timezone.utc)
+    assert timestamp_ms(naive) == timestamp_ms(aware) == 1740821400000
+
+    offset = aware.astimezone(timezone(timedelta(hours=-5)))
+    assert timestamp_ms(offset) == timestamp_ms(aware)
+
+
+def test_add_to_summary_counts_category_and_day():
+    """A reminder counts in its category and day; removing it undoes that"""
+    reminder = make_reminder('Medication morning', date(2025, 3, 1), True)
+    deltas = add_to_summary({}, reminder)
+    assert deltas == {
+        'by_category': {'medication': {'total': 1, 'completed': 1}},
+        'daily': {'2025-03-01': {'total': 1, 'completed': 1}}
+    }
+
+    add_to_summary(deltas, reminder, -1)
+    assert deltas['by_category']['medication'] == {'total': 0, 'completed': 0}
+    assert deltas['daily']['2025-03-01'] == {'total': 0, 'completed': 0}
+
+
+def test_summary_increments_leaves_out_unchanged_counters():
+    """Only non-zero deltas become Increment transforms"""
+    before = make_reminder('Walk', date(2025, 3, 1))
+    after = dict(before, isCompleted=True)
+    deltas = add_to_summary(add_to_summary({}, before, -1), after)
+
+    increments = summary_increments(deltas)
+    assert set(increments) == {'by_category', 'daily'}
+    for counts in (increments['by_category']['walk'],
+                   increments['daily']['2025-03-01']):
+        assert set(counts) == {'completed'}
+        assert isinstance(counts['completed'], firestore.Increment)
+        assert counts['completed'].value == 1
+
+    assert summary_increments(add_to_summary(
+        add_to_summary({}, before), before, -1)) == {}
+
+
+def test_compute_stats_totals_the_period():
+    """Trend is oldest first and totals only cover the requested days"""
+    today = date(2025, 3, 10)
+    summary = build_summary([
+        make_reminder('Medication', today, True),
+        make_reminder('Medication', today - timedelta(days=1)),
+        make_reminder('Appointment', today - timedelta(days=1), True),
+        # Outside a 3-day period
+        make_reminder('Walk', today - timedelta(days=5), True)
+    ])
+
+    stats = compute_stats(summary, today, 3)
+    assert [day['date'] for day in stats['completion_trend']] == [
+        '2025-03-07', '2025-03-08', '2025-03-09', '2025-03-10'
+    ]
+    assert stats['daily_completion'] == [0, 0, 50.0, 100.0]
+    assert (stats['total'], stats['completed'], stats['missed']) == (3, 2, 1)
+    assert stats['completion_rate'] == 66.7
+    assert stats['by_category']['medication'] == {
+        'total': 2, 'completed': 1, 'completion_rate': 50.0
+    }
+    assert 'walk' in stats['by_category']
+
+
+def test_compute_stats_leaves_out_reminders_not_yet_due():
+    """Today's reminders still ahead are neither completed nor missed"""
+    today = date(2025, 3, 10)
+    summary = build_summary([
+        make_reminder('Medication', today, True),
+        make_reminder('Medication', today),
+        make_reminder('Walk', today),
+        make_reminder('Call', today, True)
+    ])
+
+    stats = compute_stats(summary, today, 1,
+                          {'total': 2, 'completed': 1})
+    assert stats['completion_trend'][-1] == {
+        'date': '2025-03-10', 'total': 2, 'completed': 1, 'rate': 50.0
+    }
+    assert (stats['total'], stats['completed'], stats['missed']) == (2, 1, 1)
+
+    # Counts are floored at zero if the summary lags behind
+    stats = compute_stats(summary, today, 1, {'total': 9, 'completed': 9})
+    assert stats['completion_trend'][-1]['total'] == 0
+    assert stats['completion_trend'][-1]['completed'] == 0
+    assert stats['completion_rate'] == 0
+
+
+if __name__ == "__main__":
+    test_timestamp_ms_treats_naive_datetimes_as_utc()
+    test_add_to_summary_counts_category_and_day()
+    test_summary_increments_leaves_out_unchanged_counters()
+    test_compute_stats_totals_the_period()
+    test_compute_stats_leaves_out_reminders_not_yet_due()
+    print("✅ Reminder stats tests passed")
@@ -1,16 +1,22 @@
+from functools import lru_cache
+
 from google.cloud import aiplatform
 from vertexai.language_models import TextEmbeddingModel
 
 
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """Load the embedding model once per process"""
+    # Initialize Vertex AI
+    aiplatform.init(project="memento-98a1c")
+    return TextEmbeddingModel.from_pretrained("textembedding-gecko@latest")
+
+
 def test_vertex_ai_connection():
     """Test if Vertex AI is properly configured"""
     try:
-        # Initialize Vertex AI
-        aiplatform.init(project="memento-98a1c")
-
         # Try to load an embedding model
-        model = TextEmbeddingModel.from_pretrained(
-            "textembedding-gecko@latest")
+        model = get_embedding_model()
 
         # Test a simple embedding
         embeddings = model.get_embeddings(["Hello, world!"])
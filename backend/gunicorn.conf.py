@@ -0,0 +1,30 @@
+# Gunicorn configuration for serving the Memento API
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# Requests spend most of their time waiting on Firestore and Vertex AI, so
+# each worker process runs a pool of threads. A request blocked on a network
+# call releases the GIL and the worker keeps serving others. Threads are used
+# instead of gevent because the Google clients talk gRPC, which does not
+# cooperate with gevent's monkey-patching.
+import multiprocessing
+import os
+
+wsgi_app = "run:app"
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:5000")
+
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+
+# Load the app in each worker after the fork, never in the master: gRPC
+# channels don't survive fork(), so every worker creates its own Firestore
+# client, and create_app's schema check opens the channel before the worker
+# accepts requests. Throughput scales with workers (processes) more than
+# threads for Firestore-heavy requests.
+preload_app = False
+
+# Quiz generation waits on Gemini, so allow for a slow model response
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
@@ -1,3 +1,12 @@
+import os
+
+# `python run.py` serves the API with gunicorn (settings in gunicorn.conf.py),
+# which imports this module as run:app in each of its worker processes. Set
+# FLASK_DEBUG=1 to use Flask's development server with the debugger instead.
+if __name__ == '__main__' and os.getenv('FLASK_DEBUG') != '1':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.execvp('gunicorn', ['gunicorn', '-c', 'gunicorn.conf.py'])
+
 from app import create_app
 
 app = create_app()